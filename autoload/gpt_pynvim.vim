@@ -13,37 +13,78 @@ endif
 
 scriptencoding utf-8
 
+let s:startup_start = reltime()
+let g:gpt_pynvim_startup_times = {}
 let s:plugin_root_dir = fnamemodify(resolve(expand('<sfile>:p')), ':h')
 let s:parent_dir = fnamemodify(s:plugin_root_dir, ':h')
 
 function! s:CheckPythonDependencies()
+  let l:start = reltime()
   python3 << EOF
+import hashlib
+import json
+import os
+import sys
 try:
-    from importlib.metadata import version, distributions # Python 3.8+
+    from importlib.metadata import version, PackageNotFoundError # Python 3.8+
 except ImportError:
-    from importlib_metadata import version, distributions
+    from importlib_metadata import version, PackageNotFoundError
+
+def parse_version(value):
+    parts = []
+    for part in value.split('.'):
+        digits = ''.join(c for c in part if c.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+def dependency_cache_key(parent_dir, required_packages):
+    key = hashlib.sha1()
+    key.update(sys.executable.encode())
+    key.update(sys.version.encode())
+    key.update(repr(sorted(required_packages.items())).encode())
+    try:
+        with open(os.path.join(parent_dir, 'requirements.txt'), 'rb') as f:
+            key.update(f.read())
+    except OSError:
+        pass
+    return key.hexdigest()
 
 def check_dependencies():
     required_packages = {'pynvim': '0.4.3', 'openai': '0.28.0', 'requests': '2.25.1', 'tiktoken': '0.5.1', 'markdownify': '0.11.6', 'bs4': '0.0.1'}
-    
-    installed_packages = {}
-    for dist in distributions():
-        installed_packages[dist.metadata['Name']] = dist.version
-
-    missing_packages = {
-        pkg: version for pkg, version in required_packages.items()
-        if pkg not in installed_packages or installed_packages[pkg] < version
-    }
+    parent_dir = vim.eval('s:parent_dir')
+    cache_file = os.path.join(vim.eval("stdpath('cache')"), 'gpt_pynvim_dependencies.json')
+    cache_key = dependency_cache_key(parent_dir, required_packages)
+    try:
+        with open(cache_file) as f:
+            if json.load(f).get('key') == cache_key:
+                return
+    except (OSError, ValueError):
+        pass
+
+    missing_packages = {}
+    for pkg, required_version in required_packages.items():
+        try:
+            if parse_version(version(pkg)) < parse_version(required_version):
+                missing_packages[pkg] = required_version
+        except PackageNotFoundError:
+            missing_packages[pkg] = required_version
     if missing_packages:
-        parent_dir = vim.eval('s:parent_dir')
         print((
         f"Missing Python packages: {missing_packages}. Enter to install them.\n" +
         f"Installing Python dependencies from {parent_dir}/requirements.txt"
         ))
         cmd = f"pip3 install -r {parent_dir}/requirements.txt"
         vim.eval(f"system('{cmd}')")
+        return
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump({'key': cache_key}, f)
+    except OSError:
+        pass
 check_dependencies()
 EOF
+  let g:gpt_pynvim_startup_times['dependency check'] = reltimefloat(reltime(l:start))
 endfunction
 autocmd VimEnter * :call s:CheckPythonDependencies()
 
@@ -61,7 +102,9 @@ endfunction
 python3 << EOF
 import vim
 import sys
+import time
 from os.path import normpath, join
+_gpt_pynvim_import_start = time.perf_counter()
 plugin_root_dir = vim.eval('s:plugin_root_dir')
 plugin_path = normpath(join(plugin_root_dir, '../'))
 sys.path.insert(0, plugin_path)
@@ -77,16 +120,39 @@ from gpt_pynvim import (
     vim_chat_translate_to,
     vim_chat_selected_lines,
     vim_check_history,
+    vim_page_history,
+    vim_search_history,
+    vim_history_date,
+    vim_expand_history,
     vim_clear_history,
     vim_summarize_urls,
     vim_check_prompt_log,
+    vim_page_prompt_log,
     vim_clear_prompt_log,
     vim_set_prompt_template,
+    vim_cache_stats,
+    vim_toggle_cache_bypass,
+    vim_clear_cache,
+    vim_model_routes,
+    vim_startup_time,
+    vim_list_jobs,
+    vim_cancel_jobs,
+    window_registry,
     print_config,
 )
+vim.command(
+    "let g:gpt_pynvim_startup_times['python imports'] = "
+    + f"{time.perf_counter() - _gpt_pynvim_import_start}"
+)
 print_config()
 EOF
 
+augroup gpt_pynvim_windows
+  autocmd!
+  autocmd BufWinEnter GptNvim*Window python3 window_registry.register(vim.eval("expand('<afile>:t')"), int(vim.eval("expand('<abuf>')")))
+  autocmd BufWipeout GptNvim*Window python3 window_registry.forget(int(vim.eval("expand('<abuf>')")))
+augroup END
+
 
 function! g:gpt_pynvim#GptNvimCodeReview()
   python3 << EOF
@@ -124,6 +190,46 @@ endfunction
 command! GptNvimChatHistory :call g:gpt_pynvim#GptNvimChatHistory()
 
 
+function! g:gpt_pynvim#GptNvimChatHistoryOlder()
+  python3 << EOF
+vim_page_history(GPT_NVIM_CHAT_HISTORY_WINDOW, -1)
+EOF
+endfunction
+command! GptNvimChatHistoryOlder :call g:gpt_pynvim#GptNvimChatHistoryOlder()
+
+
+function! g:gpt_pynvim#GptNvimChatHistoryNewer()
+  python3 << EOF
+vim_page_history(GPT_NVIM_CHAT_HISTORY_WINDOW, 1)
+EOF
+endfunction
+command! GptNvimChatHistoryNewer :call g:gpt_pynvim#GptNvimChatHistoryNewer()
+
+
+function! g:gpt_pynvim#GptNvimChatHistorySearch(query)
+  python3 << EOF
+vim_search_history(GPT_NVIM_CHAT_HISTORY_WINDOW, vim.eval('a:query'))
+EOF
+endfunction
+command! -nargs=* GptNvimChatHistorySearch :call g:gpt_pynvim#GptNvimChatHistorySearch(<q-args>)
+
+
+function! g:gpt_pynvim#GptNvimChatHistoryDate(date)
+  python3 << EOF
+vim_history_date(GPT_NVIM_CHAT_HISTORY_WINDOW, vim.eval('a:date'))
+EOF
+endfunction
+command! -nargs=1 GptNvimChatHistoryDate :call g:gpt_pynvim#GptNvimChatHistoryDate(<q-args>)
+
+
+function! g:gpt_pynvim#GptNvimChatHistoryExpand(number)
+  python3 << EOF
+vim_expand_history(GPT_NVIM_CHAT_HISTORY_WINDOW, vim.eval('a:number'))
+EOF
+endfunction
+command! -nargs=? GptNvimChatHistoryExpand :call g:gpt_pynvim#GptNvimChatHistoryExpand(<q-args>)
+
+
 function! g:gpt_pynvim#GptNvimChatClearHistory()
   python3 << EOF
 vim_clear_history(GPT_NVIM_CHAT_HISTORY_WINDOW)
@@ -140,6 +246,22 @@ endfunction
 command! GptNvimChatPromptLog :call g:gpt_pynvim#GptNvimChatPromptLog()
 
 
+function! g:gpt_pynvim#GptNvimChatPromptLogOlder()
+  python3 << EOF
+vim_page_prompt_log(GPT_NVIM_CHAT_PROMPT_LOG_WINDOW, -1)
+EOF
+endfunction
+command! GptNvimChatPromptLogOlder :call g:gpt_pynvim#GptNvimChatPromptLogOlder()
+
+
+function! g:gpt_pynvim#GptNvimChatPromptLogNewer()
+  python3 << EOF
+vim_page_prompt_log(GPT_NVIM_CHAT_PROMPT_LOG_WINDOW, 1)
+EOF
+endfunction
+command! GptNvimChatPromptLogNewer :call g:gpt_pynvim#GptNvimChatPromptLogNewer()
+
+
 function! g:gpt_pynvim#GptNvimChatClearPromptLog()
   python3 << EOF
 vim_clear_prompt_log(GPT_NVIM_CHAT_PROMPT_LOG_WINDOW)
@@ -164,6 +286,62 @@ endfunction
 command! GptNvimSummarizeUrlsSend :call g:gpt_pynvim#GptNvimSummarizeUrlsSend()
 
 
+function! g:gpt_pynvim#GptNvimCacheStats()
+  python3 << EOF
+vim_cache_stats()
+EOF
+endfunction
+command! GptNvimCacheStats :call g:gpt_pynvim#GptNvimCacheStats()
+
+
+function! g:gpt_pynvim#GptNvimCacheBypass()
+  python3 << EOF
+vim_toggle_cache_bypass()
+EOF
+endfunction
+command! GptNvimCacheBypass :call g:gpt_pynvim#GptNvimCacheBypass()
+
+
+function! g:gpt_pynvim#GptNvimCacheClear()
+  python3 << EOF
+vim_clear_cache()
+EOF
+endfunction
+command! GptNvimCacheClear :call g:gpt_pynvim#GptNvimCacheClear()
+
+
+function! g:gpt_pynvim#GptNvimModelRoutes()
+  python3 << EOF
+vim_model_routes()
+EOF
+endfunction
+command! GptNvimModelRoutes :call g:gpt_pynvim#GptNvimModelRoutes()
+
+
+function! g:gpt_pynvim#GptNvimJobs()
+  python3 << EOF
+vim_list_jobs()
+EOF
+endfunction
+command! GptNvimJobs :call g:gpt_pynvim#GptNvimJobs()
+
+
+function! g:gpt_pynvim#GptNvimCancel(job_id)
+  python3 << EOF
+vim_cancel_jobs(vim.eval('a:job_id'))
+EOF
+endfunction
+command! -nargs=? GptNvimCancel :call g:gpt_pynvim#GptNvimCancel(<q-args>)
+
+
+function! g:gpt_pynvim#GptNvimStartupTime()
+  python3 << EOF
+vim_startup_time()
+EOF
+endfunction
+command! GptNvimStartupTime :call g:gpt_pynvim#GptNvimStartupTime()
+
+
 function! g:gpt_pynvim#GptNvimUpdate()
   let l:update_command = "cd " . s:parent_dir . "; git pull"
   call system(l:update_command)
@@ -175,7 +353,8 @@ command! GptNvimUpdate :call g:gpt_pynvim#GptNvimUpdate()
 let g:prompt_template_yaml_file =s:plugin_root_dir . '/prompt_template.yaml'
 let g:own_prompt_template_yaml_file =s:parent_dir . '/prompt_template.yaml'
 
-python3 << EOF
+function! s:LoadPromptTemplates()
+  python3 << EOF
 import yaml
 import os
 prompt_template_yaml_file = vim.vars['prompt_template_yaml_file']
@@ -186,7 +365,11 @@ with open(prompt_template_yaml_file, 'r') as f:
   data = yaml.safe_load(f)
 vim.command('let s:prompt_template = ' + repr(data))
 EOF
+endfunction
 function! g:gpt_pynvim#GptNvimShowTemplateList()
+  if !exists('s:prompt_template')
+    call s:LoadPromptTemplates()
+  endif
   let template_list = []
   for i in range(len(s:prompt_template))
     let dict = s:prompt_template[i]
@@ -219,12 +402,22 @@ echo " `Ctrl+<Enter>` is equivalent to `:GptNvimChat` and `:GptNvimChatSend`."
 echo " `:GptNvimChat` to open the buffer for questions."
 echo " `:GptNvimChatSend` to send the question to GPT."
 echo " `:GptNvimChatHistory` to check history of questions and answers."
+echo " `:GptNvimChatHistoryOlder` / `:GptNvimChatHistoryNewer` to page through history."
+echo " `:GptNvimChatHistorySearch {words}` / `:GptNvimChatHistoryDate {YYYY-MM-DD}` to search history."
+echo " `:GptNvimChatHistoryExpand [n]` to expand or collapse a history turn."
 echo " `:GptNvimChatClearHistory` to clear history of questions and answers."
 echo " `:GptNvimChatPromptLog` to check prompt log."
+echo " `:GptNvimChatPromptLogOlder` / `:GptNvimChatPromptLogNewer` to page through prompt log."
 echo " `:GptNvimChatClearPromptLog` to clear prompt log."
 echo " `:GptNvimUpdate` to update the plugin."
+echo " `:GptNvimJobs` to list queued and running requests."
+echo " `:GptNvimCancel [id]` to cancel one or all requests."
+echo " `:GptNvimStartupTime` to show how long the plugin took to load."
+echo " `:GptNvimCacheStats` / `:GptNvimCacheBypass` / `:GptNvimCacheClear` to manage the completion cache."
+echo " `:GptNvimModelRoutes` to show which model recent requests were routed to."
 echo " `:GptNvimSummarizeUrls` to summarize urls."
 echo " `:GptNvimSummarizeUrlsSend` to summarize urls."
 echo "\n"
 
+let g:gpt_pynvim_startup_times['script'] = reltimefloat(reltime(s:startup_start))
 let g:gpt_pynvim_loaded = 1
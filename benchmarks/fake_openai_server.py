@@ -0,0 +1,170 @@
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+URL_PATTERN = re.compile(r"https?://[^\s)\]>\"']+")
+
+
+class FakeOpenAIServer:
+    """Local stand-in for the OpenAI chat completions endpoint.
+
+    Every reply waits `latency` seconds before the first token and then emits
+    `reply_tokens` words at `tokens_per_second`. `finish_reasons` is cycled
+    through per request, so `["length", "stop"]` exercises one continuation.
+    `GET /page?size=N` serves an HTML page of roughly N bytes for the URL
+    summary benchmarks.
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0,
+                 reply_tokens: int = 50, finish_reasons: list[str] = None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.set_finish_reasons(finish_reasons or ["stop"])
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/v1"
+
+    def set_finish_reasons(self, finish_reasons: list[str]):
+        self._finish_reasons = itertools.cycle(finish_reasons)
+        self._finish_lock = threading.Lock()
+
+    def next_finish_reason(self) -> str:
+        with self._finish_lock:
+            return next(self._finish_reasons)
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                match = re.search(r"size=(\d+)", self.path)
+                size = int(match.group(1)) if match else 10_000
+                self._send(200, "text/html; charset=utf-8", server.page(size))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                time.sleep(server.latency)
+                if request.get("functions"):
+                    body = json.dumps(server.function_call_response(request))
+                    self._send(200, "application/json", body.encode("utf-8"))
+                elif request.get("stream"):
+                    self._stream(request)
+                else:
+                    body = json.dumps(server.completion_response(request))
+                    self._send(200, "application/json", body.encode("utf-8"))
+
+            def _send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, request: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                finish_reason = server.next_finish_reason()
+                for word in server.words():
+                    server.pace()
+                    self._event(server.chunk(request, {"content": word}, None))
+                self._event(server.chunk(request, {}, finish_reason))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, data: dict):
+                self.wfile.write(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+        return Handler
+
+    def words(self) -> list[str]:
+        return [f"token{i} " for i in range(self.reply_tokens)]
+
+    def pace(self):
+        if self.tokens_per_second:
+            time.sleep(1 / self.tokens_per_second)
+
+    def page(self, size: int) -> bytes:
+        paragraph = "<p>" + "lorem ipsum dolor sit amet. " * 20 + "</p>\n"
+        count = max(size // len(paragraph), 1)
+        html = (
+            "<html><head><title>Benchmark page</title>"
+            "<style>p { color: black; }</style></head><body>"
+            "<nav>menu</nav><main><h1>Benchmark page</h1>"
+            + paragraph * count
+            + "</main><footer>footer</footer></body></html>"
+        )
+        return html.encode("utf-8")
+
+    def completion_response(self, request: dict) -> dict:
+        for _ in range(self.reply_tokens):
+            self.pace()
+        return self._response(request, {
+            "role": "assistant", "content": "".join(self.words())
+        }, self.next_finish_reason())
+
+    def function_call_response(self, request: dict) -> dict:
+        text = " ".join(m.get("content") or "" for m in request["messages"])
+        arguments = json.dumps({"urls": URL_PATTERN.findall(text)})
+        return self._response(request, {
+            "role": "assistant",
+            "content": None,
+            "function_call": {"name": "find_urls", "arguments": arguments},
+        }, "function_call")
+
+    def chunk(self, request: dict, delta: dict, finish_reason: str) -> dict:
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _response(self, request: dict, message: dict, finish_reason: str) -> dict:
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": self.reply_tokens,
+                      "total_tokens": self.reply_tokens},
+        }
@@ -0,0 +1,282 @@
+"""Offline benchmarks for the plugin's own overhead.
+
+Runs the chat, continuation, URL summary and translation paths against a
+local fake OpenAI endpoint and a stubbed `vim` module, and reports per-stage
+timings and peak memory as history size and page size grow.
+
+    python -m benchmarks.run --history-sizes 10 100 1000 --page-sizes 10000 100000
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable
+
+from . import vim_stub
+from .fake_openai_server import FakeOpenAIServer
+
+WINDOW_NAME = "GptNvimChatWindow"
+
+
+class StageTimer:
+    """Accumulates exclusive wall time per stage across threads.
+
+    Time spent in a nested instrumented call is charged to the inner stage
+    only, so stages add up to (at most) the total wall time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals = defaultdict(float)
+            self.calls = defaultdict(int)
+
+    def _stack(self) -> list[list[float]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _enter(self):
+        self._stack().append([time.perf_counter(), 0.0])
+
+    def _exit(self, stage: str):
+        started_at, child_time = self._stack().pop()
+        elapsed = time.perf_counter() - started_at
+        if self._stack():
+            self._stack()[-1][1] += elapsed
+        with self._lock:
+            self.totals[stage] += elapsed - child_time
+            self.calls[stage] += 1
+
+    def wrap(self, owner: Any, name: str, stage: str, iterator: bool = False):
+        original = getattr(owner, name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            self._enter()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                self._exit(stage)
+            return self._wrap_iterator(result, stage) if iterator else result
+
+        setattr(owner, name, timed)
+
+    def _wrap_iterator(self, iterator, stage: str):
+        iterator = iter(iterator)
+        while True:
+            self._enter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(stage)
+            yield item
+
+
+def instrument(timer: StageTimer):
+    from gpt_pynvim.chat import completion, conversation, generate_summary
+    from gpt_pynvim.common.utils import (
+        history_store,
+        prompt_log,
+        token_counter,
+        window_buffer_handler,
+    )
+
+    timer.wrap(token_counter.TokenCounter, "count", "tokenization")
+    timer.wrap(history_store.HistoryStore, "records", "context_io")
+    timer.wrap(history_store.HistoryStore, "append", "context_io")
+    timer.wrap(prompt_log.PromptLog, "_append", "context_io")
+    timer.wrap(conversation.Conversation, "conversation_messages", "prompt_assembly")
+    timer.wrap(conversation, "code_review_messages", "prompt_assembly")
+    timer.wrap(generate_summary.GenerateSummary, "generate_summary_messages",
+               "prompt_assembly")
+    timer.wrap(generate_summary.GenerateSummary, "combine_summary_messages",
+               "prompt_assembly")
+    timer.wrap(generate_summary.GenerateSummary, "build_chunks_from_markdown",
+               "chunking", iterator=True)
+    timer.wrap(generate_summary.GenerateSummary, "request", "page_fetch")
+    timer.wrap(generate_summary, "extract_page", "html_extraction")
+    timer.wrap(completion.ChatCompletion, "create", "api")
+    timer.wrap(completion.ChatCompletion, "get_stream_content", "api")
+    timer.wrap(window_buffer_handler, "unsafe_update_window_buffer", "rendering")
+    timer.wrap(window_buffer_handler.RenderQueue, "flush", "rendering")
+
+
+def make_turns(size: int, words: int = 80) -> list[list[dict[str, str]]]:
+    text = " ".join(f"word{i}" for i in range(words))
+    return [
+        [
+            {"role": "user", "content": f"question {i}: {text}"},
+            {"role": "assistant", "content": f"answer {i}: {text}"},
+        ]
+        for i in range(size)
+    ]
+
+
+def run_scenario(vim: vim_stub.VimStub, timer: StageTimer, name: str,
+                 param: Any, setup: Callable[[], None],
+                 func: Callable[[], Any]) -> dict[str, Any]:
+    from gpt_pynvim.common.utils.file_handler import prompt_log
+
+    setup()
+    timer.reset()
+    vim.reset_counters()
+    started_at = time.perf_counter()
+    func()
+    prompt_log.flush()
+    wall = time.perf_counter() - started_at
+    stages = dict(timer.totals)
+    counters = {
+        "async_calls": vim.async_calls,
+        "commands": vim.commands,
+        "evals": vim.evals,
+        "api_calls": vim.api_calls,
+    }
+
+    setup()
+    tracemalloc.start()
+    func()
+    prompt_log.flush()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    overhead = wall - stages.get("api", 0.0) - stages.get("page_fetch", 0.0)
+    return {
+        "scenario": name,
+        "param": param,
+        "wall_s": wall,
+        "overhead_s": overhead,
+        "stages_s": stages,
+        "peak_memory_kb": peak / 1024,
+        "vim": counters,
+    }
+
+
+def print_report(results: list[dict[str, Any]]):
+    stages = sorted({stage for r in results for stage in r["stages_s"]})
+    header = ["scenario", "param", "wall", "overhead", *stages, "peak KiB",
+              "async", "cmds"]
+    rows = [header]
+    for r in results:
+        rows.append([
+            r["scenario"],
+            str(r["param"]),
+            f"{r['wall_s'] * 1000:.1f}ms",
+            f"{r['overhead_s'] * 1000:.1f}ms",
+            *[f"{r['stages_s'].get(stage, 0.0) * 1000:.1f}ms" for stage in stages],
+            f"{r['peak_memory_kb']:.0f}",
+            str(r["vim"]["async_calls"]),
+            str(r["vim"]["commands"]),
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history-sizes", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--page-sizes", type=int, nargs="+",
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--continuations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds before the first token of each reply")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="reply token rate, 0 for as fast as possible")
+    parser.add_argument("--reply-tokens", type=int, default=50)
+    parser.add_argument("--json", action="store_true",
+                        help="print results as JSON instead of a table")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    data_dir = tempfile.mkdtemp(prefix="gpt_pynvim_bench_")
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "GNVM_DATA_DIR": data_dir,
+        "GNVM_CONTEXT_HISTORY_SIZE": str(max(args.history_sizes)),
+        "GNVM_PRIOR_CONVERSAION_SIZE": str(max(args.continuations + 1, 6)),
+        "GNVM_COMPLETION_CACHE": "0",
+        "GNVM_PAGE_CACHE": "0",
+        "GNVM_STREAM_UPDATE_INTERVAL": "0",
+        "GNVM_RENDER_INTERVAL": "0",
+    })
+    vim = vim_stub.install()
+    server = FakeOpenAIServer(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+    ).start()
+    try:
+        import openai
+        import gpt_pynvim
+        from gpt_pynvim.chat import translate
+        from gpt_pynvim.common.utils.file_handler import history_store
+
+        openai.api_base = server.api_base
+        timer = StageTimer()
+        instrument(timer)
+        conversation = gpt_pynvim.conversation
+        conversation.set_window_name(WINDOW_NAME)
+        generate_summary = gpt_pynvim.generate_summary
+        generate_summary.set_window_name(WINDOW_NAME)
+        results = []
+
+        for size in args.history_sizes:
+            results.append(run_scenario(
+                vim, timer, "conversation", size,
+                lambda size=size: history_store.import_turns(make_turns(size)),
+                lambda: conversation.start("How do I reverse a list in Python?"),
+            ))
+
+        def setup_continuation():
+            history_store.import_turns(make_turns(10))
+            server.set_finish_reasons(["length"] * args.continuations + ["stop"])
+
+        results.append(run_scenario(
+            vim, timer, "continuation", args.continuations, setup_continuation,
+            lambda: gpt_pynvim.conversation_start(WINDOW_NAME, "Explain asyncio."),
+        ))
+        server.set_finish_reasons(["stop"])
+
+        for size in args.page_sizes:
+            url = f"{server.base_url}/page?size={size}"
+            results.append(run_scenario(
+                vim, timer, "summary", size, lambda: None,
+                lambda url=url: generate_summary.start(f"Summarize {url}"),
+            ))
+
+        translate.TRANSLATE_USER_MESSAGE = 1
+        translate.LANGUAGE = "Japanese"
+        results.append(run_scenario(
+            vim, timer, "translate", 1, lambda: None,
+            lambda: conversation._translate.start("リストを逆順にする方法"),
+        ))
+
+        if args.json:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        else:
+            print_report(results)
+    finally:
+        server.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import sys
+import types
+
+
+class Buffer(list):
+
+    def __init__(self, number: int, name: str = ""):
+        super().__init__([""])
+        self.number = number
+        self.handle = number
+        self.name = name
+        self.options = {}
+        self.vars = {}
+
+    def append(self, lines, index: int = None):
+        if not isinstance(lines, list):
+            lines = [lines]
+        if index is None:
+            self.extend(lines)
+        else:
+            self[index:index] = lines
+
+
+class Window:
+
+    def __init__(self, handle: int, buffer: Buffer):
+        self.handle = handle
+        self.number = handle
+        self.buffer = buffer
+        self.cursor = (1, 0)
+        self.valid = True
+
+
+class Current:
+
+    def __init__(self, window: Window):
+        self.window = window
+
+    @property
+    def buffer(self) -> Buffer:
+        return self.window.buffer
+
+
+class Api:
+    """The subset of `vim.api` the plugin calls, backed by the stub state."""
+
+    def __init__(self, vim: "VimStub"):
+        self._vim = vim
+
+    def __getattr__(self, name: str):
+        def call(*args, **kwargs):
+            self._vim.api_calls += 1
+            return None
+        return call
+
+    def buf_get_lines(self, buffer: int, start: int, end: int, strict: bool):
+        self._vim.api_calls += 1
+        lines = self._vim.buffer_by_handle(buffer)
+        return list(lines[start:None if end == -1 else end])
+
+    def buf_set_lines(self, buffer: int, start: int, end: int, strict: bool,
+                      lines: list[str]):
+        self._vim.api_calls += 1
+        target = self._vim.buffer_by_handle(buffer)
+        target[start:None if end == -1 else end] = lines
+
+    def buf_line_count(self, buffer: int) -> int:
+        self._vim.api_calls += 1
+        return len(self._vim.buffer_by_handle(buffer))
+
+    def set_current_win(self, window: int):
+        self._vim.api_calls += 1
+        for w in self._vim.windows:
+            if w.handle == window:
+                self._vim.current.window = w
+
+    def win_close(self, window: int, force: bool):
+        self._vim.api_calls += 1
+        self._vim.windows[:] = [w for w in self._vim.windows if w.handle != window]
+        if self._vim.current.window.handle == window and self._vim.windows:
+            self._vim.current.window = self._vim.windows[0]
+
+
+class VimStub(types.ModuleType):
+    """Minimal in-process stand-in for the `vim` module provided by pynvim.
+
+    `async_call` runs the callback immediately on the calling thread, and
+    every command and API call is counted so benchmarks can report RPC volume.
+    """
+
+    def __init__(self):
+        super().__init__("vim")
+        self._next_handle = 1
+        first = Buffer(self._handle(), "main")
+        self.buffers = [first]
+        self.windows = [Window(self._handle(), first)]
+        self.current = Current(self.windows[0])
+        self.vars = {}
+        self.vvars = {}
+        self.api = Api(self)
+        self.commands = 0
+        self.evals = 0
+        self.async_calls = 0
+        self.api_calls = 0
+
+    def _handle(self) -> int:
+        handle = self._next_handle
+        self._next_handle += 1
+        return handle
+
+    def buffer_by_handle(self, handle: int) -> Buffer:
+        if handle == 0:
+            return self.current.buffer
+        for buffer in self.buffers:
+            if buffer.handle == handle:
+                return buffer
+        raise KeyError(handle)
+
+    def command(self, command: str):
+        self.commands += 1
+        parts = command.split()
+        if parts and parts[0] in ("new", "vnew"):
+            buffer = Buffer(self._handle(), parts[1] if len(parts) > 1 else "")
+            window = Window(self._handle(), buffer)
+            self.buffers.append(buffer)
+            self.windows.append(window)
+            self.current.window = window
+
+    def eval(self, expression: str):
+        self.evals += 1
+        return "0"
+
+    def call(self, function: str, *args):
+        self.evals += 1
+        if function == "win_findbuf":
+            return [w.handle for w in self.windows if w.buffer.handle == args[0]]
+        return 0
+
+    def async_call(self, function, *args, **kwargs):
+        self.async_calls += 1
+        function(*args, **kwargs)
+
+    def reset_counters(self):
+        self.commands = 0
+        self.evals = 0
+        self.async_calls = 0
+        self.api_calls = 0
+
+
+def install() -> VimStub:
+    vim = VimStub()
+    sys.modules["vim"] = vim
+    return vim
@@ -1,5 +1,7 @@
+import re
 import vim
 import threading
+import time
 from .common.config import (
     DEBUG,
     MAX_TOKENS,
@@ -11,8 +13,13 @@ from .common.config import (
     OPEN_WINDOW_SIZE,
     OPENAI_API_MODEL_NAME,
     ALLOWED_MODELS,
-    CONTEXT_FILE_PATH,
+    HISTORY_FILE_PATH,
     PROMPT_FILE_PATH,
+    STREAM_RESPONSE,
+    HISTORY_COMPACTION,
+    MAX_WORKERS,
+    GPT_NVIM_CHAT_WINDOW,
+    GPT_NVIM_CHAT_SUMMARIZE_URLS_WINDOW,
 )
 from .common.utils.window_buffer_handler import (
     update_window_buffer,
@@ -20,21 +27,89 @@ from .common.utils.window_buffer_handler import (
     open_window,
     check_window_name,
     unsafe_update_window_buffer,
-    set_common_vim_buffer_options,
+    open_split,
     get_selected_lines,
+    window_registry,
+    WindowBufferStream,
 )
 from .common.utils.file_handler import (
     load_prompt_from_file,
     clear_context_file,
     clear_prompt_file,
+    history_store,
 )
-from .common.errors import ChatCompletionError
-from .chat.conversation import Conversation
-from .chat.generate_summary import GenerateSummary
+from .common.utils.history_viewer import HistoryViewer
+from .common.utils.job_scheduler import (
+    JobScheduler,
+    INTERACTIVE,
+    BACKGROUND,
+    current_job,
+)
+from .common.errors import ChatCompletionError, ConversationError
+
+
+def current_cancel_event():
+    job = current_job()
+    return job.cancel_event if job else None
+
+
+def report_job_error(job):
+    vim.async_call(vim.command, f'echo "{job.name} failed: {job.error}"')
+
+
+# Sessions are kept per window so concurrent requests for different windows
+# never share `_window_name`, `_code_review_flag` or `_finish_reason`.
+conversation_sessions = {}
+generate_summary_sessions = {}
+scheduler = JobScheduler(MAX_WORKERS, on_error=report_job_error)
+_load_lock = threading.Lock()
+load_times = {}
+prompt_log_page = None
+history_viewer = HistoryViewer(history_store)
+
+
+def get_conversation(window_name: str = GPT_NVIM_CHAT_WINDOW):
+    with _load_lock:
+        if window_name not in conversation_sessions:
+            started_at = time.perf_counter()
+            from .chat.conversation import Conversation
+            conversation_sessions[window_name] = Conversation()
+            load_times.setdefault("conversation", time.perf_counter() - started_at)
+    return conversation_sessions[window_name]
+
 
+def get_generate_summary(window_name: str = GPT_NVIM_CHAT_SUMMARIZE_URLS_WINDOW):
+    with _load_lock:
+        if window_name not in generate_summary_sessions:
+            started_at = time.perf_counter()
+            from .chat.generate_summary import GenerateSummary
+            generate_summary_sessions[window_name] = GenerateSummary()
+            load_times.setdefault(
+                "generate_summary", time.perf_counter() - started_at
+            )
+    return generate_summary_sessions[window_name]
 
-conversation = Conversation()
-generate_summary = GenerateSummary()
+
+def get_completion_cache():
+    from .chat.completion import completion_cache
+    return completion_cache
+
+
+def get_model_router():
+    from .chat.completion import model_router
+    return model_router
+
+
+def __getattr__(name: str):
+    # Keep `gpt_pynvim.conversation` and friends working without importing
+    # openai and friends when the plugin is loaded.
+    if name == "conversation":
+        return get_conversation()
+    if name == "generate_summary":
+        return get_generate_summary()
+    if name == "completion_cache":
+        return get_completion_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def print_config():
@@ -47,7 +122,8 @@ def print_config():
         print(" PRIOR CONVERSAION SIZE:", PRIOR_CONVERSAION_SIZE)
         print(" CONTEXT HISTORY SIZE:", CONTEXT_HISTORY_SIZE)
         print(" TEMPERATURE:", TEMPERATURE)
-        print(" CONTEXT FILE PATH:", CONTEXT_FILE_PATH)
+        print(" STREAM RESPONSE:", STREAM_RESPONSE)
+        print(" HISTORY FILE PATH:", HISTORY_FILE_PATH)
         print(" PROMPT FILE PATH:", PROMPT_FILE_PATH)
         print(" OPEN WINDOW DIRECTION:", OPEN_WINDOW_DIRECTION)
         if OPEN_WINDOW_SIZE:
@@ -55,47 +131,73 @@ def print_config():
 
 
 def conversation_start(
-    window_name: str, user_message: str, code_review_flag: bool = False
+    window_name: str, user_message: str, code_review_flag: bool = False,
+    review_source: str = "",
 ):
+    conversation = get_conversation(window_name)
     conversation.set_window_name(window_name)
+    conversation.set_cancel_event(current_cancel_event())
     if code_review_flag:
-        conversation.set_code_review_flag(True)
-    message = user_message
-    mode = "w"
-    loop_count = 0
-    while True:
-        try:
-            content = conversation.start(message)
-        except ChatCompletionError as e:
-            vim.async_call(vim.command, f'echo "{e}"')
-            break
-        update_window_buffer(window_name, content, mode)
-        if conversation.finish_reason == "stop":
-            message = "Conversation finished."
-            if code_review_flag:
-                message = "Code review done and conversation history cleared."
-                clear_context_file()
-                conversation.set_code_review_flag(False)
-            vim.async_call(vim.command, f'echo "{message}"')
-            break
-        else:
-            vim.async_call(vim.command, "echo 'Conversation continuing.'")
-            message = "Please continue from where it left off."
-            mode = "a"
-        loop_count += 1
-        if loop_count > PRIOR_CONVERSAION_SIZE:
-            message = f"Loop count exceeded {loop_count}.\nConversation stopped."
-            vim.async_call(vim.command, f'echo "{message}"')
-            break
+        conversation.set_code_review_flag(True, review_source)
+    stream = WindowBufferStream(window_name, "w") if STREAM_RESPONSE else None
+    try:
+        content = conversation.start(user_message, stream.write if stream else None)
+    except (ChatCompletionError, ConversationError) as e:
+        if conversation.cancelled:
+            e = "Request cancelled."
+        conversation.set_code_review_flag(False)
+        vim.async_call(vim.command, f'echo "{e}"')
+        return
+    finally:
+        if stream:
+            stream.close()
+    conversation.set_code_review_flag(False)
+    if not stream:
+        update_window_buffer(window_name, content, "w")
+    stats = conversation.review_stats if code_review_flag else {}
+    if stats.get("cut_off"):
+        # Each unit ran its own continuations, so there is no single count.
+        message = f"Code review cut off in {stats['cut_off']} units."
+    elif conversation.finish_reason != "stop":
+        subject = "Code review" if code_review_flag else "Answer"
+        message = f"{subject} truncated after {conversation.continuations} continuations."
+    else:
+        message = "Code review done." if code_review_flag else "Conversation finished."
+        if conversation.continuations:
+            message += f" Continued {conversation.continuations} times."
+    if (conversation.tokens_saved or 0) > 0:
+        message += (
+            f" History summary saved {conversation.tokens_saved} prompt tokens."
+        )
+    if stats.get("reused"):
+        message += (
+            f" Reused {stats['reused']} unchanged unit reviews, "
+            + f"reviewed {stats['changed']} changed and {stats['new']} new units."
+        )
+    if HISTORY_COMPACTION:
+        # Not tied to the window, so the next question is not queued
+        # behind the summary request.
+        scheduler.submit(
+            "compact_history", compact_history, window_name,
+            priority=BACKGROUND,
+        )
+    vim.async_call(vim.command, f'echo "{message}"')
+
+
+def compact_history(window_name: str):
+    get_conversation(window_name).compact_history(current_cancel_event())
 
 
 def generate_summary_start(window_name: str, buffer_content: str):
+    generate_summary = get_generate_summary(window_name)
     generate_summary.set_window_name(window_name)
+    generate_summary.set_cancel_event(current_cancel_event())
     update_window_buffer(window_name, "Please wait. AI is thinking...", "w")
     try:
-        content = generate_summary.start(window_name, buffer_content)
+        content = generate_summary.start(buffer_content)
     except ChatCompletionError as e:
         vim.async_call(vim.command, f'echo "{e}"')
+        return
     update_window_buffer(window_name, content, "w")
 
 
@@ -118,36 +220,86 @@ def vim_clear_prompt_log(window_name: str):
     vim.command('echo "Prompt log cleared."')
 
 
-def vim_check_prompt_log(window_name: str):
-    log_text = load_prompt_from_file()
+def vim_check_prompt_log(window_name: str, page: int = None):
+    global prompt_log_page
+    log_text, page, page_count = load_prompt_from_file(page)
     if log_text:
+        prompt_log_page = page
         close_window(window_name)
-        vim.command(f"new {window_name}")
-        set_common_vim_buffer_options()
+        open_split(window_name, "new")
         vim.command("wincmd J")
+        header = (
+            f"[Prompt log page {page + 1}/{page_count}] "
+            + ":GptNvimChatPromptLogOlder / :GptNvimChatPromptLogNewer"
+        )
+        unsafe_update_window_buffer(window_name, f"{header}\n{log_text}", "w")
         vim.command("normal G")
-        unsafe_update_window_buffer(window_name, log_text, "w")
     else:
         vim.command('echo "Prompt log is empty."')
 
 
+def vim_page_prompt_log(window_name: str, step: int):
+    if prompt_log_page is None:
+        vim_check_prompt_log(window_name)
+        return
+    vim_check_prompt_log(window_name, max(prompt_log_page + step, 0))
+
+
 def vim_clear_history(window_name: str):
     close_window(window_name)
     clear_context_file()
     vim.command('echo "History cleared."')
 
 
-def vim_check_history(window_name: str):
-    if conversation.context:
-        close_window(window_name)
-        vim.command(f"new {window_name}")
-        set_common_vim_buffer_options()
+def show_history(window_name: str, cursor_turn: int = None):
+    history_text, _, _ = history_viewer.render()
+    if not check_window_name(window_name):
+        open_split(window_name, "new")
         vim.command("wincmd J")
+    unsafe_update_window_buffer(window_name, history_text, "w")
+    if cursor_turn is None:
         vim.command("normal G")
-        conversation.set_window_name(window_name)
-        conversation.display_context()
-    else:
+        return
+    for row, line in enumerate(vim.current.buffer, 1):
+        if line.startswith(f"[{cursor_turn}] "):
+            vim.api.win_set_cursor(0, [row, 0])
+            break
+
+
+def vim_check_history(window_name: str):
+    if not len(history_store):
         vim.command('echo "History not found."')
+        return
+    close_window(window_name)
+    history_viewer.reset()
+    show_history(window_name)
+
+
+def vim_page_history(window_name: str, step: int):
+    history_viewer.page(step)
+    show_history(window_name)
+
+
+def vim_search_history(window_name: str, query: str):
+    history_viewer.search(query)
+    show_history(window_name)
+
+
+def vim_history_date(window_name: str, date: str):
+    if not history_viewer.jump_to_date(date):
+        vim.command(f'echo "No history on or after {date}."')
+        return
+    show_history(window_name)
+
+
+def vim_expand_history(window_name: str, number: str = ""):
+    if not number:
+        match = re.match(r"\[(\d+)\]", vim.current.line)
+        number = match.group(1) if match else ""
+    if not number.isdigit() or not history_viewer.toggle(int(number)):
+        vim.command('echo "Error: No history turn to expand."')
+        return
+    show_history(window_name, int(number))
 
 
 def vim_chat_translate_to(window_name: str, language: str = LANGUAGE):
@@ -176,14 +328,10 @@ def vim_chat(window_name: str):
         vim.command('echo "Error: Empty message."')
         return
     display_please_wait_message(window_name, buffer_content)
-    thread = threading.Thread(
-        target=conversation_start,
-        args=(
-            window_name,
-            buffer_content,
-        ),
+    scheduler.submit(
+        "chat", conversation_start, window_name, buffer_content,
+        window_name=window_name, priority=INTERACTIVE,
     )
-    thread.start()
 
 
 def vim_summarize_urls(window_name: str):
@@ -201,31 +349,21 @@ def vim_summarize_urls(window_name: str):
         vim.command('echo "Error: Empty urls."')
         return
     display_please_wait_message(window_name, buffer_content)
-    thread = threading.Thread(
-        target=generate_summary_start,
-        args=(
-            window_name,
-            buffer_content,
-        ),
+    scheduler.submit(
+        "summarize_urls", generate_summary_start, window_name, buffer_content,
+        window_name=window_name, priority=BACKGROUND,
     )
-    thread.start()
 
 
 def vim_code_review(window_name: str):
-    clear_context_file()
-    message = "Code review started and conversation history cleared."
-    vim.command(f'echo "{message}"')
+    vim.command('echo "Code review started."')
     selected_code = get_selected_lines()
+    source = vim.current.buffer.name
     display_please_wait_message(window_name, selected_code)
-    thread = threading.Thread(
-        target=conversation_start,
-        args=(
-            window_name,
-            selected_code,
-            True,
-        ),
+    scheduler.submit(
+        "code_review", conversation_start, window_name, selected_code, True, source,
+        window_name=window_name, priority=INTERACTIVE,
     )
-    thread.start()
 
 
 def vim_set_prompt_template(window_name: str, prompt_template):
@@ -233,3 +371,84 @@ def vim_set_prompt_template(window_name: str, prompt_template):
         vim.command('echo "Error: Empty prompt template."')
         return
     unsafe_update_window_buffer(window_name, f"{prompt_template}", "a")
+
+
+def vim_cache_stats():
+    completion_cache = get_completion_cache()
+    stats = completion_cache.stats()
+    message = (
+        f"Completion cache: {'on' if stats['enabled'] else 'off'}"
+        + f"{' (bypassed)' if stats['bypass'] else ''}, "
+        + f"hits: {stats['hits']}, misses: {stats['misses']}, "
+        + f"hit rate: {stats['hit_rate']:.0%}"
+    )
+    vim.command(f'echo "{message}"')
+
+
+def vim_toggle_cache_bypass():
+    completion_cache = get_completion_cache()
+    completion_cache.bypass = not completion_cache.bypass
+    state = "bypassed" if completion_cache.bypass else "in use"
+    vim.command(f'echo "Completion cache {state}."')
+
+
+def vim_clear_cache():
+    completion_cache = get_completion_cache()
+    completion_cache.clear()
+    vim.command('echo "Completion cache cleared."')
+
+
+def vim_model_routes():
+    decisions = get_model_router().decisions()
+    if not decisions:
+        print("No routed requests yet.")
+        return
+    lines = ["[GPTNvim model routes]"]
+    for decision in decisions:
+        created_at = time.strftime("%H:%M:%S", time.localtime(decision.created_at))
+        lines.append(
+            f" {created_at} {decision.task} -> {decision.model} "
+            + f"({decision.tokens} tokens, {decision.reason})"
+        )
+    print("\n".join(lines))
+
+
+def vim_cancel_jobs(job_id: str = ""):
+    job_id = job_id.strip().lstrip("#")
+    if job_id and not job_id.isdigit():
+        vim.command('echo "Usage: :GptNvimCancel [job id]"')
+        return
+    cancelled = scheduler.cancel(int(job_id) if job_id else None)
+    if not cancelled:
+        vim.command('echo "No jobs to cancel."')
+        return
+    job_ids = ", ".join(f"#{job.job_id}" for job in cancelled)
+    vim.command(f'echo "Cancelled {job_ids}."')
+
+
+def vim_list_jobs():
+    jobs = scheduler.jobs()
+    if not jobs:
+        print("No jobs.")
+        return
+    lines = ["[GPTNvim jobs]"]
+    for job in jobs:
+        lines.append(
+            f" #{job.job_id} {job.name} ({job.priority_name}) "
+            + f"{job.window_name or '-'}: {job.status} {job.elapsed:.1f}s"
+        )
+    print("\n".join(lines))
+
+
+def vim_startup_time():
+    startup_times = vim.vars.get("gpt_pynvim_startup_times", {})
+    message = "[GPTNvim startup time]"
+    for name, seconds in startup_times.items():
+        name = name.decode() if isinstance(name, bytes) else name
+        message += f"\n {name}: {float(seconds) * 1000:.1f}ms"
+    for name in ("conversation", "generate_summary"):
+        if name in load_times:
+            message += f"\n {name} (first use): {load_times[name] * 1000:.1f}ms"
+        else:
+            message += f"\n {name} (first use): not loaded yet"
+    print(message)
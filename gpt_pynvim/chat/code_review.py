@@ -1,7 +1,50 @@
-from ..common.config import LANGUAGE
+from concurrent.futures import ThreadPoolExecutor
+import json
+import re
+import textwrap
 
+from .completion import ChatCompletion, model_router
+from ..common.config import (
+    LANGUAGE,
+    CODE_REVIEW_UNIT_TOKENS,
+    CODE_REVIEW_MAX_WORKERS,
+    CODE_REVIEW_CACHE,
+    COMPLETION_CACHE_FILE_PATH,
+    CODE_REVIEW_CACHE_MAX_ENTRIES,
+)
+from ..common.utils.code_splitter import CodeUnit, outline, pack_units, split_code
+from ..common.utils.completion_cache import CompletionCache
+from ..common.utils.window_buffer_handler import update_window_buffer
 
-def code_review_messages(code: str, prior_conversation: list[dict[str, str]] = None) -> list[dict[str, str]]:
+SCORE_NAMES = ["Readability", "Maintainability", "Security", "Coding Style", "Overall"]
+SCORE_PATTERN = re.compile(
+    r"^[*-]\s*(" + "|".join(SCORE_NAMES) + r")\s*:\s*([\d.]+)\s*/\s*5\s*(.*)$"
+)
+EMPTY_SECTION_PATTERN = re.compile(r"^[\s*]*(N/?A)?[\s.]*$", re.IGNORECASE)
+# Bump when the review prompt changes, so stale reviews are not reused.
+REVIEW_PROMPT_VERSION = "1"
+# About one unit in this many starts a new packed group.
+PACK_BOUNDARY_MODULUS = 4
+
+review_cache = CompletionCache(
+    COMPLETION_CACHE_FILE_PATH,
+    enabled=bool(CODE_REVIEW_CACHE),
+    max_entries=CODE_REVIEW_CACHE_MAX_ENTRIES,
+    namespace="code_review",
+)
+
+
+def normalize_code(code: str) -> str:
+    """Dedents `code` and drops blank lines and trailing whitespace.
+
+    Re-indenting a unit or adding blank lines around it keeps its review.
+    """
+    lines = textwrap.dedent(code).split("\n")
+    return "\n".join(line.rstrip() for line in lines if line.strip())
+
+
+def code_review_messages(code: str, prior_conversation: list[dict[str, str]] = None,
+                         file_context: str = "") -> list[dict[str, str]]:
     system = "You are a programming specialist assisting a programmer. "
     messages = [{"role": "system", "content": system}]
     if prior_conversation:
@@ -88,8 +131,216 @@ Code changes suggestion rules and format are as follows:
 ```
 """
     })
+    if file_context:
+        messages.append({
+            "role": "user",
+            "content": "Here is an outline of the rest of the file for context. "
+            + f"Do not review it:\n```{file_context}```"
+        })
     messages.append({
         "role": "user",
         "content": f"Here is the code:\n```{code}```"
     })
     return messages
+
+
+def parse_review(content: str) -> dict:
+    review = {"scores": {}, "bugs": [], "suggestions": ""}
+    section = None
+    suggestions = []
+    for line in content.split("\n"):
+        if line.startswith("## "):
+            heading = line[3:].lower()
+            section = (
+                "scores" if heading.startswith("score")
+                else "bugs" if heading.startswith("bug")
+                else "suggestions" if heading.startswith("code change")
+                else None
+            )
+            continue
+        if section == "scores":
+            match = SCORE_PATTERN.match(line.strip())
+            if match:
+                try:
+                    score = float(match.group(2))
+                except ValueError:
+                    continue
+                review["scores"][match.group(1)] = (score, match.group(3).strip())
+        elif section == "bugs":
+            if line.strip().startswith("*") and not EMPTY_SECTION_PATTERN.match(line):
+                review["bugs"].append(line.strip().lstrip("* ").strip())
+        elif section == "suggestions":
+            suggestions.append(line)
+    text = "\n".join(suggestions).strip()
+    if not EMPTY_SECTION_PATTERN.match(text):
+        review["suggestions"] = text
+    return review
+
+
+def merge_reviews(reviews: list[tuple[CodeUnit, str, int]]) -> str:
+    """Merges per-unit reviews into one report in the review template.
+
+    Scores are averaged, weighted by each unit's token count. Bugs and
+    suggestions are kept per unit. Reviews that do not follow the template
+    are appended verbatim under their unit's heading.
+    """
+    parsed = [(unit, parse_review(content), weight) for unit, content, weight in reviews]
+    unparsed = [
+        f"### {unit.label}\n{content.strip()}"
+        for (unit, content, _), (_, review, _) in zip(reviews, parsed)
+        if content.strip()
+        and not (review["scores"] or review["bugs"] or review["suggestions"])
+    ]
+    lines = ["## Score and comments"]
+    for name in SCORE_NAMES:
+        scored = [
+            (unit, review["scores"][name], weight)
+            for unit, review, weight in parsed if name in review["scores"]
+        ]
+        if not scored:
+            lines.append(f"* {name}: N/A")
+            continue
+        total = sum(max(weight, 1) for _, _, weight in scored)
+        average = sum(score * max(weight, 1) for _, (score, _), weight in scored) / total
+        lines.append(f"* {name}: {average:.1f}/5")
+        for unit, (score, comment), _ in scored:
+            lines.append(f"  * {unit.label}: {score:g}/5 {comment}".rstrip())
+    lines.append("")
+    lines.append("## Bugs")
+    bugs = [f"* [{unit.label}] {bug}" for unit, review, _ in parsed for bug in review["bugs"]]
+    lines.extend(bugs or ["N/A"])
+    lines.append("")
+    lines.append("## Code changes suggestion as follows:")
+    suggestions = [
+        f"### {unit.label}\n{review['suggestions']}"
+        for unit, review, _ in parsed if review["suggestions"]
+    ]
+    lines.extend(suggestions or ["N/A"])
+    if unparsed:
+        lines.append("")
+        lines.append("## Other reviews")
+        lines.extend(unparsed)
+    return "\n".join(lines)
+
+
+class CodeReview(ChatCompletion):
+    """Reviews code unit by unit, reusing the reviews of unchanged units.
+
+    The selection is split at function and class boundaries, small
+    neighbouring units are packed up to `unit_tokens`, and every unit whose
+    normalized text has no stored review is reviewed in parallel with an
+    outline of the whole selection.
+    """
+    task = "code_review"
+
+    def __init__(self, unit_tokens: int = CODE_REVIEW_UNIT_TOKENS,
+                 max_workers: int = CODE_REVIEW_MAX_WORKERS):
+        super().__init__()
+        self._unit_tokens = unit_tokens
+        self._max_workers = max(max_workers, 1)
+        self._stats = {}
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Reused, changed and new unit counts of the last `cached_reviews` call,
+        and how many units the following `start` had cut off at max tokens."""
+        return dict(self._stats)
+
+    def unit_key(self, text: str) -> str:
+        return review_cache.text_key(
+            REVIEW_PROMPT_VERSION, LANGUAGE, model_router.primary(self.task).name,
+            normalize_code(text),
+        )
+
+    def is_boundary(self, unit: CodeUnit) -> bool:
+        # Content-defined group starts keep the packing of unchanged units
+        # stable when an edit changes the size of one unit.
+        return int(self.unit_key(unit.text)[:8], 16) % PACK_BOUNDARY_MODULUS == 0
+
+    def split(self, code: str) -> list[CodeUnit]:
+        """Returns the review units of `code`; one unit means one request."""
+        selection = CodeUnit("selection", 1, code.count("\n") + 1, code)
+        if not self._unit_tokens or self.num_tokens_from_string(code) <= self._unit_tokens:
+            return [selection]
+        boundary = self.is_boundary if review_cache.enabled else None
+        units = pack_units(
+            split_code(code), self.num_tokens_from_string, self._unit_tokens, boundary
+        )
+        return units or [selection]
+
+    def cached_reviews(self, units: list[CodeUnit], source: str = "") -> list[str]:
+        """Returns the stored review of every unit, or None for changed units.
+
+        Units are compared by name with the last review of `source` to tell
+        changed units from new ones.
+        """
+        cached = [review_cache.get(self.unit_key(unit.text)) for unit in units]
+        previous = set()
+        if source and review_cache.enabled:
+            try:
+                previous = set(json.loads(review_cache.get(review_cache.text_key(source)) or "[]"))
+            except ValueError:
+                pass
+        missing = [unit for unit, content in zip(units, cached) if content is None]
+        changed = sum(1 for unit in missing if unit.name in previous)
+        self._stats = {
+            "reused": len(units) - len(missing),
+            "changed": changed,
+            "new": len(missing) - changed,
+            "cut_off": 0,
+        }
+        return cached
+
+    def save_reviews(self, units: list[CodeUnit], contents: list[str],
+                     finish_reasons: list[str], source: str = ""):
+        # A review cut off at max tokens would otherwise be reused silently.
+        for unit, content, finish_reason in zip(units, contents, finish_reasons):
+            if content and finish_reason == "stop":
+                review_cache.put(self.unit_key(unit.text), content)
+        if source:
+            review_cache.put(review_cache.text_key(source), json.dumps([unit.name for unit in units]))
+
+    def review_unit(self, unit: CodeUnit, file_context: str) -> tuple[str, str]:
+        """Returns the unit's review, continued if cut off, and its finish_reason."""
+        self.check_cancelled()
+        update_window_buffer(self.window_name, f"Reviewing {unit.label}")
+        messages = code_review_messages(unit.text, file_context=file_context)
+        content, finish_reason, _ = self.complete(messages)
+        return content, finish_reason
+
+    def start(self, code: str, units: list[CodeUnit], cached: list[str] = None,
+              source: str = "") -> tuple[str, str]:
+        """Returns the merged review and "length" if any unit was cut off."""
+        cached = cached or [None] * len(units)
+        pending = [unit for unit, content in zip(units, cached) if content is None]
+        reviewed = {}
+        if pending:
+            file_context = outline(code, units)
+            max_workers = min(self._max_workers, len(pending))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                reviewed = dict(zip(pending, executor.map(
+                    lambda unit: self.review_unit(unit, file_context), pending
+                )))
+        contents = [
+            content if content is not None else reviewed[unit][0]
+            for unit, content in zip(units, cached)
+        ]
+        finish_reasons = [
+            "stop" if content is not None else reviewed[unit][1]
+            for unit, content in zip(units, cached)
+        ]
+        truncated = [
+            unit.label for unit, (_, finish_reason) in reviewed.items()
+            if finish_reason != "stop"
+        ]
+        self._stats["cut_off"] = len(truncated)
+        if truncated:
+            update_window_buffer(
+                self.window_name, f"Review cut off at max tokens: {', '.join(truncated)}"
+            )
+        self.save_reviews(units, contents, finish_reasons, source)
+        merged = merge_reviews([
+            (unit, content, self.num_tokens_from_string(unit.text))
+            for unit, content in zip(units, contents)
+        ])
+        return merged, "length" if truncated else "stop"
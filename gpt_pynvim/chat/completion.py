@@ -1,46 +1,125 @@
 from os import environ
-from typing import Any
+from typing import Any, Callable, Iterator
+import threading
+import time
 import openai
-import tiktoken
 import vim
 
-from ..common.errors import ChatCompletionError
+from ..common.errors import ChatCompletionError, ChatCompletionCancelled
+from ..common.utils.completion_cache import CompletionCache
+from ..common.utils.model_registry import ModelRouter
+from ..common.utils.rate_limiter import RateLimiter, backoff_delay
+from ..common.utils.token_counter import get_token_counter
 from ..common.config import (
     OPENAI_API_MODEL_NAME,
     ALLOWED_MODELS,
-    MODEL_NAME_FOR_LONG_MESSAGES,
-    MAX_TOKENS_SIZE,
+    MODEL_REGISTRY,
+    MODEL_ROUTES,
+    MODEL_ROUTE_LOG_SIZE,
     MAX_TOKENS,
+    CONTINUATION_MAX_ROUNDS,
     TEMPERATURE,
     MODEL_AUTO_SELECT,
+    COMPLETION_CACHE,
+    COMPLETION_CACHE_FILE_PATH,
+    COMPLETION_CACHE_MEMORY_SIZE,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_TTL,
+    REQUEST_TIMEOUT,
+    MAX_RETRIES,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    REQUESTS_PER_MINUTE,
+    TOKENS_PER_MINUTE,
 )
 
 
+# This module is imported by the first request, inside a scheduler worker,
+# so configuration errors are raised for the job to report instead of
+# exiting the worker thread.
 openai.api_key = environ.get("OPENAI_API_KEY")
 if not openai.api_key:
-    print("Error: OPENAI_API_KEY is not set")
-    exit(1)
+    raise ChatCompletionError("Error: OPENAI_API_KEY is not set")
 
 
 if OPENAI_API_MODEL_NAME not in ALLOWED_MODELS:
-    print(
-        (
-            f"Error: Invalid model name: {OPENAI_API_MODEL_NAME},"
-            f"allowed models: {ALLOWED_MODELS}"
-        )
+    raise ChatCompletionError(
+        f"Error: Invalid model name: {OPENAI_API_MODEL_NAME}, "
+        f"allowed models: {ALLOWED_MODELS}"
     )
-    exit(1)
+
+
+model_router = ModelRouter(
+    MODEL_REGISTRY,
+    MODEL_ROUTES,
+    default_task="chat",
+    overflow=bool(MODEL_AUTO_SELECT),
+    log_size=MODEL_ROUTE_LOG_SIZE,
+)
+if model_router.unknown_models():
+    raise ChatCompletionError(
+        f"Error: Unknown models in routes: {model_router.unknown_models()}, "
+        f"registered models: {model_router.models}"
+    )
+
+
+completion_cache = CompletionCache(
+    COMPLETION_CACHE_FILE_PATH,
+    enabled=bool(COMPLETION_CACHE),
+    memory_size=COMPLETION_CACHE_MEMORY_SIZE,
+    max_entries=COMPLETION_CACHE_MAX_ENTRIES,
+    ttl=COMPLETION_CACHE_TTL,
+)
+rate_limiter = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+CONTINUATION_PROMPT = "Continue exactly where you stopped, without repeating anything."
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    status = getattr(error, "http_status", None)
+    return isinstance(error, openai.error.APIError) and (status or 500) >= 500
+
+
+def retry_after(error: Exception) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
 
 
 class ChatCompletion:
+    # Routing rule used for requests, see GNVM_MODEL_ROUTES.
+    task = "chat"
 
     def __init__(self):
         self._window_name = None
         self._finish_reason = None
+        self._token_counter = get_token_counter(OPENAI_API_MODEL_NAME)
+        self._cancel_event = None
 
     def set_window_name(self, value: str):
         self._window_name = value
 
+    def set_cancel_event(self, event: threading.Event):
+        self._cancel_event = event
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self._cancel_event and self._cancel_event.is_set())
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise ChatCompletionCancelled("Request cancelled.")
+
     def reset_finish_reason(self):
         self._finish_reason = None
 
@@ -55,38 +134,68 @@ class ChatCompletion:
         return self._finish_reason
 
     def num_tokens_from_string(self, content: str) -> int:
-        encoding = tiktoken.encoding_for_model(OPENAI_API_MODEL_NAME)
-        num_tokens = len(encoding.encode(content))
-        return num_tokens
+        return self._token_counter.count(content)
 
     def calculate_token_count(self, messages: list[dict[str, str]]) -> int:
         return sum(self.num_tokens_from_string(c["content"]) for c in messages)
 
-    def run_model_auto_select(self, messages: list[dict[str, str]]) -> str:
-        if not messages:
-            return OPENAI_API_MODEL_NAME
-        conversation_token_count = self.calculate_token_count(messages)
-        max_token_size = MAX_TOKENS_SIZE.get(OPENAI_API_MODEL_NAME, 2048)
-        available_token_size = max_token_size - MAX_TOKENS
-        if MODEL_AUTO_SELECT:
-            if conversation_token_count > available_token_size:
-                message = (
-                    "!!!!WARNING!!!!\n" +
-                    f"Messages token count: ({conversation_token_count})\n" +
-                    f"Available token size: ({available_token_size}).\n" +
-                    f"Selected model: {MODEL_NAME_FOR_LONG_MESSAGES}."
-                )
-                vim.async_call(vim.command, f"echo \"{message}\"")
-                return MODEL_NAME_FOR_LONG_MESSAGES
-        return OPENAI_API_MODEL_NAME
+    def select_model(self, messages: list[dict[str, str]], task: str = None,
+                     max_tokens: int = MAX_TOKENS) -> str:
+        task = task or self.task
+        tokens = self.calculate_token_count(messages) + (max_tokens or 0)
+        decision = model_router.route(task, tokens)
+        if decision.reason != "fits":
+            primary = model_router.primary(task)
+            message = (
+                "!!!!WARNING!!!!\n" +
+                f"Messages token count: ({tokens})\n" +
+                f"Available token size: ({primary.context_window}).\n" +
+                f"Selected model: {decision.model}."
+            )
+            vim.async_call(vim.command, f"echo \"{message}\"")
+        return decision.model
 
-    def get_content(self, response: dict[str, Any]) -> str:
-        content = ""
+    def read_content(self, response: dict[str, Any]) -> tuple[str, str]:
+        """Returns `(content, finish_reason)` without touching the session.
+
+        Requests made in parallel on one instance use this instead of
+        `get_content`, whose `finish_reason` would be shared between them.
+        """
         try:
-            content = response["choices"][0]["message"]["content"]
-            self._finish_reason = response["choices"][0]["finish_reason"]
+            choice = response["choices"][0]
+            return choice["message"]["content"], choice["finish_reason"]
         except Exception as e:
             raise ChatCompletionError("Failed to parse response.", e)
+
+    def get_content(self, response: dict[str, Any]) -> str:
+        content, self._finish_reason = self.read_content(response)
+        return content
+
+    def read_stream(self, response: Iterator[dict[str, Any]],
+                    on_delta: Callable[[str], None] = None) -> tuple[str, str]:
+        """Streaming counterpart of `read_content`."""
+        contents = []
+        finish_reason = None
+        try:
+            for chunk in response:
+                self.check_cancelled()
+                choice = chunk["choices"][0]
+                delta = choice["delta"].get("content")
+                if delta:
+                    contents.append(delta)
+                    if on_delta:
+                        on_delta(delta)
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+        except ChatCompletionCancelled:
+            raise
+        except Exception as e:
+            raise ChatCompletionError("Failed to parse streamed response.", e)
+        return "".join(contents), finish_reason
+
+    def get_stream_content(self, response: Iterator[dict[str, Any]],
+                           on_delta: Callable[[str], None] = None) -> str:
+        content, self._finish_reason = self.read_stream(response, on_delta)
         return content
 
     def get_message(self, response: dict[str, Any]) -> dict[str, Any]:
@@ -97,33 +206,115 @@ class ChatCompletion:
             raise ChatCompletionError("Failed to parse response.", e)
         return message
 
-    def get_response_content(self, messages: list[dict[str, str]]) -> str:
+    def get_response_content(self, messages: list[dict[str, str]],
+                             task: str = None, **kwargs) -> str:
         if not messages:
             return ""
-        response = self.create(messages)
+        response = self.create(messages, task=task, **kwargs)
         return self.get_content(response)
 
+    def get_response_stream_content(self, messages: list[dict[str, str]],
+                                    on_delta: Callable[[str], None],
+                                    task: str = None, **kwargs) -> str:
+        if not messages:
+            return ""
+        self.reset_finish_reason()
+        response = self.create(messages, task=task, stream=True, **kwargs)
+        return self.get_stream_content(response, on_delta)
+
+    def complete(self, messages: list[dict[str, str]],
+                 on_delta: Callable[[str], None] = None, task: str = None,
+                 max_rounds: int = CONTINUATION_MAX_ROUNDS) -> tuple[str, str, int]:
+        """Returns `(content, finish_reason, continuations)` of a whole reply.
+
+        While the reply is cut at max_tokens, it is continued by re-sending
+        `messages` unchanged, followed by the reply so far as one assistant
+        message, on the same model. Continuing stops after `max_rounds` or
+        before the prompt would no longer leave room for MAX_TOKENS. Nothing
+        is stored on the instance, so parallel requests may share it.
+        """
+        def request(messages: list[dict[str, str]]) -> tuple[str, str]:
+            if on_delta:
+                response = self.create(messages, model=model, stream=True)
+                return self.read_stream(response, on_delta)
+            return self.read_content(self.create(messages, model=model))
+
+        model = self.select_model(messages, task)
+        content, finish_reason = request(messages)
+        rounds = 0
+        while finish_reason == "length" and rounds < max_rounds:
+            continuation = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": CONTINUATION_PROMPT},
+            ]
+            tokens = self.calculate_token_count(continuation) + MAX_TOKENS
+            if tokens > model_router.spec(model).context_window:
+                break
+            delta, finish_reason = request(continuation)
+            content += delta
+            rounds += 1
+        return content, finish_reason, rounds
+
     def get_response_message(self, messages: list[dict[str, str]],
-                             functions: dict[str, Any]) -> dict[str, Any]:
+                             functions: dict[str, Any],
+                             task: str = None) -> dict[str, Any]:
         if not messages:
             return {}
         options = {"functions": functions, "function_call": "auto"}
-        response = self.create(messages, **options)
+        response = self.create(messages, task=task, **options)
         return self.get_message(response)
 
-    def create(self, messages: list[dict[str, str]], **kwargs):
+    def create(self, messages: list[dict[str, str]], task: str = None, **kwargs):
         default_chat_options = {
             "model": OPENAI_API_MODEL_NAME,
             "max_tokens": MAX_TOKENS,
             "temperature": TEMPERATURE,
         }
-        model_name = self.run_model_auto_select(messages)
         options = {**default_chat_options, **kwargs}
-        options["model"] = model_name
+        if messages and "model" not in kwargs:
+            options["model"] = self.select_model(
+                messages, task, options.get("max_tokens")
+            )
         if messages:
             options["messages"] = messages
-        try:
-            response = openai.ChatCompletion.create(**options)
-            return response
-        except Exception as e:
-            raise ChatCompletionError(e)
+        cache_key = None
+        if completion_cache.accepts(options):
+            cache_key = completion_cache.key(options)
+            cached = completion_cache.get(cache_key)
+            if cached:
+                if options.get("stream"):
+                    return completion_cache.as_stream(cached)
+                return cached
+        response = self.request_with_retry(options)
+        if cache_key:
+            if options.get("stream"):
+                return completion_cache.put_stream(cache_key, response)
+            completion_cache.put(cache_key, response)
+        return response
+
+    def request_with_retry(self, options: dict[str, Any]):
+        options = {"request_timeout": REQUEST_TIMEOUT, **options}
+        tokens = self.calculate_token_count(options.get("messages", []))
+        tokens += options.get("max_tokens") or 0
+        attempt = 0
+        while True:
+            self.check_cancelled()
+            if not rate_limiter.acquire(tokens, self._cancel_event):
+                self.check_cancelled()
+            try:
+                return openai.ChatCompletion.create(**options)
+            except Exception as e:
+                if attempt >= MAX_RETRIES or not is_retryable(e):
+                    raise ChatCompletionError(e)
+                delay = backoff_delay(
+                    attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY, retry_after(e)
+                )
+                vim.async_call(
+                    vim.command,
+                    f"echo 'Retrying in {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})'",
+                )
+                attempt += 1
+                if self._cancel_event:
+                    self._cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
@@ -1,37 +1,78 @@
+import threading
+from typing import Callable
+
 from .completion import ChatCompletion
-from .code_review import code_review_messages
+from .code_review import CodeReview, code_review_messages
+from .history_summary import HistorySummary
 from .translate import Translate
 from ..common.errors import ConversationError
 from ..common.config import (
     LANGUAGE,
     MAX_TOKENS,
+    CONTINUATION_MAX_ROUNDS,
     PRIOR_CONVERSAION_SIZE,
-    CONTEXT_HISTORY_SIZE,
+    PRIOR_CONVERSATION_MODE,
+    PRIOR_CONVERSATION_MODES,
+    PRIOR_CONVERSATION_TOKENS,
+    HISTORY_COMPACTION,
 )
+from ..common.utils.context_index import ContextIndex
 from ..common.utils.file_handler import (
-    load_context_from_file,
-    save_context_to_file,
+    history_store,
     save_prompt_to_file,
 )
-from ..common.utils.window_buffer_handler import update_window_buffer
+
+context_index = ContextIndex(history_store)
 
 
 class Conversation(ChatCompletion):
 
-    def __init__(self):
+    def __init__(self, prior_mode: str = PRIOR_CONVERSATION_MODE,
+                 prior_tokens: int = PRIOR_CONVERSATION_TOKENS,
+                 compaction: bool = bool(HISTORY_COMPACTION),
+                 continuation_rounds: int = CONTINUATION_MAX_ROUNDS):
         super().__init__()
-        self._context_data = load_context_from_file()
+        if prior_mode not in PRIOR_CONVERSATION_MODES:
+            raise ConversationError(
+                f"Invalid prior conversation mode: {prior_mode}, "
+                + f"allowed modes: {PRIOR_CONVERSATION_MODES}"
+            )
+        self._prior_mode = prior_mode
+        self._prior_tokens = prior_tokens
+        self._history = history_store
+        self._context_index = context_index
+        self._history_summary = HistorySummary() if compaction else None
+        self._tokens_saved = None
+        self._continuation_rounds = max(continuation_rounds, 0)
+        self._continuations = 0
         self._translate = Translate()
+        self._code_review = CodeReview()
         self._prior_conversation = []
         self._code_review_flag = False
+        self._review_source = ""
 
-    def set_code_review_flag(self, flag: bool):
+    def set_code_review_flag(self, flag: bool, source: str = ""):
         self._code_review_flag = flag
+        self._review_source = source if flag else ""
+
+    @property
+    def review_stats(self) -> dict[str, int]:
+        """Reused, changed and new unit counts of the last code review."""
+        return self._code_review.stats
+
+    @property
+    def tokens_saved(self) -> int:
+        """Prior-context tokens saved by the history summary on the last request."""
+        return self._tokens_saved
+
+    @property
+    def continuations(self) -> int:
+        """Continuation requests made for the last reply."""
+        return self._continuations
 
     @property
     def context(self) -> list[dict[str, str]]:
-        self._context_data = load_context_from_file()
-        return self._context_data["context"]
+        return self._history.turns()
 
     def conversation_messages(
         self, user_message: str, prior_conversation: list[dict[str, str]] = None
@@ -41,6 +82,11 @@ class Conversation(ChatCompletion):
             f"Respond in {LANGUAGE}, concisely, within {MAX_TOKENS} tokens. " +
             "If unsure, reply 'I don't know'. "
         )
+        if self._translate.inline:
+            system += (
+                f"The user may write in {LANGUAGE}; read the question as if it "
+                + "had been translated to English before answering. "
+            )
         messages = [{"role": "system", "content": system}]
         if prior_conversation:
             for message in prior_conversation:
@@ -48,34 +94,124 @@ class Conversation(ChatCompletion):
         messages.append({"role": "user", "content": user_message})
         return messages
 
-    def get_prior_conversation(self) -> list[dict[str, str]]:
-        return self.context[-PRIOR_CONVERSAION_SIZE:] if self.context else []
-
-    def display_context(self, context: list[dict[str, str]] = None):
-        if not context:
-            context = self.context
-        for user_and_assistant in context:
-            q = ""
-            a = ""
-            for message in user_and_assistant:
-                if message["role"] == "user":
-                    q = message["content"]
-                    update_window_buffer(self.window_name, f"\nQ:{q}\n")
-                elif message["role"] == "assistant":
-                    a = message["content"]
-                    update_window_buffer(self.window_name, f"\nA:{a}\n")
+    def get_prior_conversation(self, user_message: str = "") -> list[dict[str, str]]:
+        if self._prior_mode == "relevant" and user_message:
+            records = self.select_relevant_records(user_message)
+        else:
+            size = PRIOR_CONVERSAION_SIZE
+            records = self._history.records(size) if size else []
+            if self._history_summary:
+                # Turns are only dropped once summarized; compaction runs
+                # after the reply and may not have caught up yet.
+                records = self._history_summary.unsummarized(records)
+            for record in records:
+                self.seed_token_counts(record)
+        prior_conversation = [record["turn"] for record in records]
+        self._tokens_saved = None
+        summary_turn = self._history_summary.summary_turn() if self._history_summary else []
+        if summary_turn:
+            # Savings are only reported once a compaction has written a summary.
+            prior_conversation.insert(0, summary_turn)
+            self._tokens_saved = (
+                self.prior_token_count(self._history.records(PRIOR_CONVERSAION_SIZE))
+                - sum(self.calculate_token_count(turn) for turn in prior_conversation)
+            )
+        return prior_conversation
+
+    def prior_token_count(self, records: list[dict]) -> int:
+        for record in records:
+            self.seed_token_counts(record)
+        return sum(self.calculate_token_count(record["turn"]) for record in records)
+
+    def compact_history(self, cancel_event: threading.Event = None) -> bool:
+        if not self._history_summary:
+            return False
+        self._history_summary.set_cancel_event(cancel_event)
+        return self._history_summary.compact()
+
+    def seed_token_counts(self, record: dict):
+        if record.get("encoding") != self._token_counter.encoding_name:
+            return
+        for message, num_tokens in zip(record["turn"], record["tokens"]):
+            self._token_counter.seed(message["content"], num_tokens)
+
+    def select_relevant_records(self, user_message: str) -> list[dict]:
+        # Offsets are only valid for the history file they were read from,
+        # so start over if the file is replaced while selecting.
+        for _ in range(3):
+            records = self._select_relevant_records(user_message, self._history.generation)
+            if records is not None:
+                return records
+        return self._history.records(1)
+
+    def _select_relevant_records(self, user_message: str, generation: int) -> list[dict]:
+        # The latest turn goes first so follow-ups like "and in Go?" keep
+        # their antecedent, then the best BM25 matches until the budget runs
+        # out. Turns that do not fit are skipped, not truncated.
+        current, offsets = self._history.snapshot()
+        ranked = self._context_index.rank(user_message)
+        if current != generation or self._history.generation != generation:
+            return None
+        latest = offsets[-1:]
+        candidates = latest + [offset for offset in ranked if offset not in latest]
+        budget = self._prior_tokens
+        selected = []
+        for offset in candidates:
+            if len(selected) >= PRIOR_CONVERSAION_SIZE or budget <= 0:
+                break
+            records = self._history.read([offset], generation)
+            if records is None:
+                return None
+            record = records[0]
+            self.seed_token_counts(record)
+            num_tokens = self.calculate_token_count(record["turn"])
+            if num_tokens <= budget:
+                selected.append((offset, record))
+                budget -= num_tokens
+        return [record for _, record in sorted(selected, key=lambda item: item[0])]
+
+    def complete_reply(self, messages: list[dict[str, str]],
+                       on_delta: Callable[[str], None] = None, task: str = None) -> str:
+        content, self._finish_reason, self._continuations = self.complete(
+            messages, on_delta, task, self._continuation_rounds
+        )
+        return content
+
+    def review_code(self, code: str, messages: list[dict[str, str]],
+                    on_delta: Callable[[str], None] = None) -> str:
+        review = self._code_review
+        review.set_window_name(self.window_name)
+        review.set_cancel_event(self._cancel_event)
+        units = review.split(code)
+        cached = review.cached_reviews(units, self._review_source)
+        if len(units) == 1 and cached[0] is None:
+            content = self.complete_reply(messages, on_delta, task=review.task)
+            review.save_reviews(units, [content], [self._finish_reason], self._review_source)
+            return content
+        if len(units) == 1:
+            content = cached[0]
+            review.save_reviews(units, cached, ["stop"], self._review_source)
+            self._finish_reason = "stop"
+        else:
+            content, self._finish_reason = review.start(
+                code, units, cached, self._review_source
+            )
+        if on_delta:
+            on_delta(content)
+        return content
 
     def save_context_to_file(self, user_message: str, content: str):
         conversation = [
             {"role": "user", "content": user_message},
             {"role": "assistant", "content": content}
         ]
-        self._context_data["context"].append(conversation)
-
-        self._context_data["context"] = self._context_data["context"][
-            -CONTEXT_HISTORY_SIZE:
-        ]
-        save_context_to_file(self._context_data)
+        self._history.append(
+            conversation,
+            tokens=[self.num_tokens_from_string(m["content"]) for m in conversation],
+            encoding=self._token_counter.encoding_name,
+        )
+        if self._prior_mode == "relevant":
+            self._context_index.update()
 
     def save_prompt_to_file(self, conversation: list[dict[str, str]], content: str):
         user_messages = []
@@ -86,20 +222,31 @@ class Conversation(ChatCompletion):
                 system_message = message["content"]
         save_prompt_to_file(system_message, "\n".join(user_messages), content)
 
-    def start(self, user_message: str) -> str:
+    def start(self, user_message: str,
+              on_delta: Callable[[str], None] = None) -> str:
         try:
             if not user_message:
                 raise ConversationError("User message is empty.")
-            self._prior_conversation = self.get_prior_conversation()
+            if not self._code_review_flag:
+                user_message = self._translate.start(user_message)
             messages = []
             if self._code_review_flag:
-                messages = code_review_messages(user_message,
-                                                self._prior_conversation)
+                # Reviews stand alone, like the units of a multi-unit review,
+                # so earlier turns never grow the prompt.
+                self._prior_conversation = []
+                self._tokens_saved = None
+                messages = code_review_messages(user_message)
             else:
-                user_message = self._translate.start(user_message)
+                # Rank prior turns against the translated message, which is
+                # the form stored in history.
+                self._prior_conversation = self.get_prior_conversation(user_message)
                 messages = self.conversation_messages(user_message,
                                                       self._prior_conversation)
-            content = self.get_response_content(messages)
+            self._continuations = 0
+            if self._code_review_flag:
+                content = self.review_code(user_message, messages, on_delta)
+            else:
+                content = self.complete_reply(messages, on_delta)
             self.save_context_to_file(user_message, content)
             self.save_prompt_to_file(messages, content)
             return content
@@ -1,22 +1,75 @@
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
 import json
 import re
+import time
 
-from bs4 import BeautifulSoup
-from markdownify import markdownify as md
 import requests
+from requests.adapters import HTTPAdapter
 
-from .completion import ChatCompletion
+from .completion import ChatCompletion, model_router
 from ..common.errors import GenerateSummaryError
-from ..common.config import LANGUAGE
+from ..common.config import (
+    MAX_TOKENS,
+    LANGUAGE,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_CHUNK_OVERLAP,
+    SUMMARY_MAX_WORKERS,
+    SUMMARY_MODE,
+    SUMMARY_MODES,
+    SUMMARY_REDUCE_FAN_IN,
+    SUMMARY_URL_LLM_FALLBACK,
+    HTTP_TIMEOUT,
+    PAGE_MAX_BYTES,
+    PAGE_CACHE,
+    PAGE_CACHE_DIR,
+    PAGE_CACHE_MAX_BYTES,
+    PAGE_CACHE_TTL,
+)
+from ..common.utils.chunker import iter_token_chunks
+from ..common.utils.html_extractor import (
+    extract_page,
+    is_supported_content_type,
+    read_limited,
+)
+from ..common.utils.page_cache import PageCache
+from ..common.utils.url_extractor import extract_urls
 from ..common.utils.window_buffer_handler import update_window_buffer
 
 
 class GenerateSummary(ChatCompletion):
+    task = "summary"
 
-    def __init__(self, chunk_size: int = 1000):
+    def __init__(self, chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+                 chunk_overlap: int = SUMMARY_CHUNK_OVERLAP,
+                 max_workers: int = SUMMARY_MAX_WORKERS,
+                 mode: str = SUMMARY_MODE,
+                 fan_in: int = SUMMARY_REDUCE_FAN_IN,
+                 url_llm_fallback: bool = bool(SUMMARY_URL_LLM_FALLBACK)):
         super().__init__()
-        self._chunk_size = chunk_size
+        if mode not in SUMMARY_MODES:
+            raise GenerateSummaryError(
+                f"Invalid summary mode: {mode}, allowed modes: {SUMMARY_MODES}"
+            )
+        self._chunk_tokens = chunk_tokens
+        self._url_llm_fallback = url_llm_fallback
+        self._chunk_overlap = chunk_overlap
+        self._max_workers = max(max_workers, 1)
+        self._mode = mode
+        self._fan_in = max(fan_in, 2)
+        self._chunk_executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self._max_workers, pool_maxsize=self._max_workers
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._page_stats = {}
+        self._page_cache = None
+        if PAGE_CACHE:
+            self._page_cache = PageCache(
+                PAGE_CACHE_DIR, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_TTL
+            )
 
     def generate_summary_messages(
         self, title: str, chunk: str, prior_summary: str = ""
@@ -38,27 +91,94 @@ class GenerateSummary(ChatCompletion):
         ]
         return messsages
 
+    def combine_summary_messages(
+        self, title: str, summaries: list[str]
+    ) -> list[dict[str, str]]:
+        body = "\n---\n".join(summaries)
+        user_message = f"""
+        Combine the following partial summaries of the same text into one summary.
+        Keep the key information and useful examples, and drop repetition.
+        Title: {title}
+        Partial summaries:
+        ```
+        {body}
+        ```
+        Output language: {LANGUAGE} Summary length: less than 500 words but useful examples are more important than the length.
+        """
+        messsages = [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": user_message},
+        ]
+        return messsages
+
     def remove_links_from_markdown(self, text: str) -> str:
         return text.replace("[", "").replace("]", "")
 
-    def build_chunks_from_markdown(self, markdown: str) -> list[str]:
-        content_markdown = md(markdown)
-        markdown = self.remove_links_from_markdown(content_markdown)
-        markdown = re.sub(r"\s+", " ", markdown)
-        markdown = re.sub(r"\n+", "\n", markdown)
-        return [
-            markdown[i: i + self._chunk_size]
-            for i in range(0, len(markdown), self._chunk_size)
-        ]
+    def chunk_token_budget(self, title: str) -> int:
+        if self._chunk_tokens:
+            return self._chunk_tokens
+        max_token_size = model_router.primary(self.task).context_window
+        prompt_tokens = self.calculate_token_count(
+            self.generate_summary_messages(title, "")
+        )
+        # Refine mode also carries the previous summary (up to MAX_TOKENS).
+        reserved = MAX_TOKENS * (2 if self._mode == "refine" else 1)
+        return max(max_token_size - prompt_tokens - reserved, 256)
+
+    def build_chunks_from_markdown(self, markdown: str,
+                                   title: str = "") -> Iterator[str]:
+        markdown = self.remove_links_from_markdown(markdown)
+        markdown = re.sub(r"[ \t]+", " ", markdown)
+        markdown = re.sub(r"\n\s*\n+", "\n\n", markdown)
+        return iter_token_chunks(
+            markdown,
+            self.chunk_token_budget(title),
+            self.num_tokens_from_string,
+            self._chunk_overlap,
+        )
 
     def request(self, url: str) -> tuple[str, str]:
+        cached = self._page_cache.get_page(url) if self._page_cache else None
+        if cached and self._page_cache.is_fresh(cached):
+            return (cached["title"], cached["text"])
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            text = resp.text
-            soup = BeautifulSoup(text, "html.parser")
-            title = soup.title.string
-            return (title, soup.get_text())
+            headers = (
+                self._page_cache.revalidation_headers(cached) if cached else {}
+            )
+            started_at = time.perf_counter()
+            with self._session.get(
+                url, headers=headers, timeout=HTTP_TIMEOUT, stream=True
+            ) as resp:
+                resp.raise_for_status()
+                if cached and resp.status_code == 304:
+                    self._page_cache.touch_page(url, cached)
+                    return (cached["title"], cached["text"])
+                content_type = resp.headers.get("Content-Type", "")
+                if not is_supported_content_type(content_type):
+                    raise GenerateSummaryError(
+                        f"Unsupported content type: {content_type}"
+                    )
+                body, truncated = read_limited(
+                    resp.iter_content(64 * 1024), PAGE_MAX_BYTES
+                )
+            download = time.perf_counter() - started_at
+            title, body_text, timings = extract_page(body, content_type)
+            self._page_stats[url] = {
+                "bytes": len(body),
+                "truncated": truncated,
+                "timings": {"download": download, **timings},
+            }
+            if self._page_cache:
+                self._page_cache.put_page(
+                    url,
+                    title,
+                    body_text,
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                )
+            return (title, body_text)
+        except GenerateSummaryError:
+            raise
         except requests.RequestException as error:
             raise GenerateSummaryError(
                 f"An error occurred during your request: {error}"
@@ -89,7 +209,7 @@ class GenerateSummary(ChatCompletion):
     def find_urls(self, text: str) -> list[str]:
         functions = self.get_functions()
         messages = [{"role": "user", "content": text}]
-        message = self.get_response_message(messages, functions)
+        message = self.get_response_message(messages, functions, task="find_urls")
         arguments = json.loads(message["function_call"]["arguments"])
         return arguments.get("urls", [])
 
@@ -98,31 +218,93 @@ class GenerateSummary(ChatCompletion):
         for summary in summaries:
             message += "\n\n===Summary===\n"
             message += f"[URL]\n{summary['url']}\n"
+            message += f"[Elapsed]\n{summary['elapsed']:.2f}s\n"
+            stats = summary.get("page")
+            if stats:
+                timings = ", ".join(
+                    f"{stage} {seconds:.2f}s" for stage, seconds in stats["timings"].items()
+                )
+                truncated = " (truncated)" if stats["truncated"] else ""
+                message += f"[Page]\n{stats['bytes']} bytes{truncated}, {timings}\n"
             message += f"[Summary]\n{summary['summary']}"
         return message
 
-    def from_urls(self, urls: list[str]) -> list[dict[str, str]]:
+    def refine_summary(self, title: str, chunks: Iterator[str]) -> str:
+        prior_summary = ""
+        for chunk in chunks:
+            update_window_buffer(self.window_name, f"Chunk: {chunk}")
+            messages = self.generate_summary_messages(title, chunk, prior_summary)
+            prior_summary = self.get_response_content(messages)
+        return prior_summary
+
+    def map_reduce_summary(self, title: str, chunks: Iterator[str]) -> str:
+        def summarize_chunk(chunk: str) -> str:
+            update_window_buffer(self.window_name, f"Chunk: {chunk}")
+            messages = self.generate_summary_messages(title, chunk)
+            return self.get_response_content(messages)
+
+        def combine(summaries: list[str]) -> str:
+            if len(summaries) == 1:
+                return summaries[0]
+            messages = self.combine_summary_messages(title, summaries)
+            return self.get_response_content(messages)
+
+        summaries = list(self._chunk_executor.map(summarize_chunk, chunks))
+        while len(summaries) > 1:
+            groups = [
+                summaries[i: i + self._fan_in]
+                for i in range(0, len(summaries), self._fan_in)
+            ]
+            summaries = list(self._chunk_executor.map(combine, groups))
+        return summaries[0] if summaries else ""
+
+    def summarize_url(self, url: str) -> dict[str, Any]:
+        started_at = time.monotonic()
+        update_window_buffer(self.window_name, f"Target url: {url}")
+        try:
+            self.check_cancelled()
+            title, html_body_text = self.request(url)
+            summary_key = None
+            summary = None
+            if self._page_cache:
+                summary_key = self._page_cache.summary_key(
+                    html_body_text, self._mode, LANGUAGE,
+                    model_router.primary(self.task).name,
+                )
+                summary = self._page_cache.get_summary(summary_key)
+            if summary is None:
+                chunks = self.build_chunks_from_markdown(html_body_text, title)
+                if self._mode == "map_reduce":
+                    summary = self.map_reduce_summary(title, chunks)
+                else:
+                    summary = self.refine_summary(title, chunks)
+                if summary_key:
+                    self._page_cache.put_summary(summary_key, summary)
+        except Exception as e:
+            summary = f"Error: {e}"
+        elapsed = time.monotonic() - started_at
+        update_window_buffer(self.window_name, f"Done: {url} ({elapsed:.2f}s)")
+        return {
+            "summary": summary,
+            "url": url,
+            "elapsed": elapsed,
+            "page": self._page_stats.pop(url, None),
+        }
+
+    def from_urls(self, urls: list[str]) -> list[dict[str, Any]]:
         if not urls and not isinstance(urls, list):
             raise GenerateSummaryError("URLs are empty or not a list.")
-        summary_and_url = []
-        for url in urls:
-            update_window_buffer(self.window_name, f"Target url: {url}")
-            try:
-                title, html_body_text = self.request(url)
-                chunks = self.build_chunks_from_markdown(html_body_text)
-                prior_summary = ""
-                for chunk in chunks:
-                    update_window_buffer(self.window_name, f"Chunk: {chunk}")
-                    messages = self.generate_summary_messages(
-                        title, chunk, prior_summary
-                    )
-                    prior_summary = self.get_response_content(messages)
-                summary_and_url.append({"summary": prior_summary, "url": url})
-            except Exception as e:
-                raise GenerateSummaryError(f"An error occurred: {e}")
-        return summary_and_url
+        if not urls:
+            return []
+        max_workers = min(self._max_workers, len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.summarize_url, urls))
 
     def start(self, text: str) -> str:
-        urls = self.find_urls(text)
+        urls = extract_urls(text)
+        if not urls and self._url_llm_fallback:
+            urls = self.find_urls(text)
+        if not urls:
+            return "No URLs found."
         summaries = self.from_urls(urls)
         return self.convert_summary_to_text(summaries)
@@ -0,0 +1,112 @@
+import threading
+
+from .completion import ChatCompletion
+from ..common.errors import HistorySummaryError
+from ..common.config import (
+    HISTORY_RECENT_TURNS,
+    HISTORY_SUMMARY_BATCH_SIZE,
+    HISTORY_SUMMARY_MAX_TOKENS,
+)
+from ..common.utils.context_summary import record_key
+from ..common.utils.file_handler import context_summary, history_store
+
+# Shared by every session so two windows never fold the same turns twice.
+_compact_lock = threading.Lock()
+
+
+class HistorySummary(ChatCompletion):
+    """Folds history turns older than the recent window into one summary."""
+    task = "history_summary"
+
+    def __init__(self, recent_turns: int = HISTORY_RECENT_TURNS,
+                 max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS,
+                 batch_size: int = HISTORY_SUMMARY_BATCH_SIZE):
+        super().__init__()
+        self._history = history_store
+        self._summary = context_summary
+        self._recent_turns = max(recent_turns, 0)
+        self._max_tokens = max_tokens
+        self._batch_size = max(batch_size, 1)
+
+    @property
+    def recent_turns(self) -> int:
+        return self._recent_turns
+
+    def summary_turn(self) -> list[dict[str, str]]:
+        summary = self._summary.load().get("summary")
+        if not summary:
+            return []
+        return [{
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{summary}",
+        }]
+
+    def unsummarized(self, records: list[dict]) -> list[dict]:
+        """Drops the oldest `records` the summary covers, down to the recent window."""
+        keys = [record_key(record) for record in records]
+        last_key = self._summary.load().get("last_key")
+        if last_key not in keys:
+            return records
+        recent = max(len(records) - self._recent_turns, 0)
+        return records[min(keys.index(last_key) + 1, recent):]
+
+    def pending_records(self) -> list[dict]:
+        aged = len(self._history) - self._recent_turns
+        if aged <= 0:
+            return []
+        # Only the newest batch of aged-out turns is searched, so a missing
+        # or stale summary never triggers a read of the whole history.
+        start = max(aged - self._batch_size, 0)
+        records = self._history.records(aged - start, start)
+        keys = [record_key(record) for record in records]
+        last_key = self._summary.load().get("last_key")
+        if last_key in keys:
+            return records[keys.index(last_key) + 1:]
+        return records
+
+    def messages(self, summary: str, records: list[dict]) -> list[dict[str, str]]:
+        system = (
+            "You maintain a running summary of a conversation between a "
+            + "programmer and an assistant. Keep facts, decisions, code names "
+            + "and open questions. Drop pleasantries. "
+            + f"Answer with the updated summary only, within {self._max_tokens} tokens."
+        )
+        turns = []
+        for record in records:
+            for message in record["turn"]:
+                role = "Q" if message["role"] == "user" else "A"
+                turns.append(f"{role}: {message['content']}")
+        user = (
+            f"[Current summary]\n{summary or 'N/A'}\n\n"
+            + "[New turns]\n" + "\n".join(turns)
+        )
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+
+    def compact(self) -> bool:
+        if not _compact_lock.acquire(blocking=False):
+            return False
+        try:
+            generation = self._history.generation
+            records = self.pending_records()
+            if not records:
+                return False
+            summary = self._summary.load().get("summary", "")
+            messages = self.messages(summary, records)
+            response = self.create(
+                messages, max_tokens=self._max_tokens, temperature=0
+            )
+            content = self.get_content(response).strip()
+            if not content:
+                raise HistorySummaryError("Empty history summary.")
+            if self._history.generation != generation:
+                # The history was cleared or rewritten while summarizing.
+                return False
+            self._summary.save(
+                content, record_key(records[-1]), self.num_tokens_from_string(content)
+            )
+            return True
+        finally:
+            _compact_lock.release()
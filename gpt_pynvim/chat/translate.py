@@ -1,13 +1,36 @@
-from .completion import ChatCompletion
+from .completion import ChatCompletion, model_router
 from ..common.errors import TranslateError
-from ..common.config import LANGUAGE, TRANSLATE_USER_MESSAGE
+from ..common.config import (
+    LANGUAGE,
+    TRANSLATE_INLINE,
+    TRANSLATE_USER_MESSAGE,
+    TRANSLATION_CACHE,
+    COMPLETION_CACHE_FILE_PATH,
+    TRANSLATION_CACHE_MAX_ENTRIES,
+)
+from ..common.utils.language_detect import needs_translation
+from ..common.utils.completion_cache import CompletionCache
+
+
+translation_cache = CompletionCache(
+    COMPLETION_CACHE_FILE_PATH,
+    enabled=bool(TRANSLATION_CACHE),
+    max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+    namespace="translation",
+)
 
 
 class Translate(ChatCompletion):
+    task = "translate"
 
     def __init__(self):
         super().__init__()
 
+    @property
+    def inline(self) -> bool:
+        """Whether translation is folded into the conversation request."""
+        return bool(TRANSLATE_USER_MESSAGE and TRANSLATE_INLINE and LANGUAGE != "English")
+
     def messages(self, user_message: str) -> list[dict[str, str]]:
         messages = []
         if TRANSLATE_USER_MESSAGE and LANGUAGE != "English":
@@ -23,11 +46,19 @@ class Translate(ChatCompletion):
         if not user_message:
             raise TranslateError("User message is empty")
 
-        if TRANSLATE_USER_MESSAGE:
+        if TRANSLATE_USER_MESSAGE and not self.inline:
             try:
                 messages = self.messages(user_message)
-                if messages:
+                if messages and needs_translation(user_message, LANGUAGE):
+                    key = translation_cache.text_key(
+                        LANGUAGE, model_router.primary(self.task).name, user_message
+                    )
+                    cached = translation_cache.get(key)
+                    if cached:
+                        return cached
                     content = self.get_response_content(messages)
+                    if content:
+                        translation_cache.put(key, content)
                     return content if content else user_message
             except Exception as e:
                 raise TranslateError("An error occurred:", e)
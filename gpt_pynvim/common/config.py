@@ -1,3 +1,4 @@
+import json
 import os
 
 DEBUG = int(os.environ.get("GNVM_DEBUG", 0))
@@ -14,24 +15,94 @@ MAX_TOKENS = int(os.environ.get("GNVM_OPENAI_MAX_TOKENS", 500))
 TEMPERATURE = float(os.environ.get("GNVM_OPENAI_TEMPERATURE", 0.0))
 LANGUAGE = os.environ.get("GNVM_OPENAI_LANGUAGE", "English")
 PRIOR_CONVERSAION_SIZE = int(os.environ.get("GNVM_PRIOR_CONVERSAION_SIZE", 6))
+CONTINUATION_MAX_ROUNDS = int(os.environ.get("GNVM_CONTINUATION_MAX_ROUNDS", 6))
 CONTEXT_HISTORY_SIZE = int(os.environ.get("GNVM_CONTEXT_HISTORY_SIZE", 100))
+PRIOR_CONVERSATION_MODE = os.environ.get("GNVM_PRIOR_CONVERSATION_MODE", "recent")
+PRIOR_CONVERSATION_TOKENS = int(os.environ.get("GNVM_PRIOR_CONVERSATION_TOKENS", 1500))
+HISTORY_COMPACTION = int(os.environ.get("GNVM_HISTORY_COMPACTION", 0))
+HISTORY_RECENT_TURNS = int(os.environ.get("GNVM_HISTORY_RECENT_TURNS", 2))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.environ.get("GNVM_HISTORY_SUMMARY_MAX_TOKENS", 300))
+HISTORY_SUMMARY_BATCH_SIZE = int(os.environ.get("GNVM_HISTORY_SUMMARY_BATCH_SIZE", 20))
+CODE_REVIEW_UNIT_TOKENS = int(os.environ.get("GNVM_CODE_REVIEW_UNIT_TOKENS", 1500))
+CODE_REVIEW_MAX_WORKERS = int(os.environ.get("GNVM_CODE_REVIEW_MAX_WORKERS", 4))
 OPEN_WINDOW_DIRECTION = os.environ.get("GNVM_GPT_OPEN_VIM_WINDOW_DIRECTION", "vnew")
 OPEN_WINDOW_SIZE = os.environ.get("GNVM_GPT_OPEN_VIM_WINDOW_SIZE", None)
 TRANSLATE_USER_MESSAGE = os.environ.get("GNVM_TRANSLATE_USER_MESSAGE", 0)
-MODEL_AUTO_SELECT = os.environ.get("GNVM_MODEL_AUTO_SELECT", 1)
+TRANSLATE_INLINE = int(os.environ.get("GNVM_TRANSLATE_INLINE", 0))
+MODEL_AUTO_SELECT = int(os.environ.get("GNVM_MODEL_AUTO_SELECT", 1))
+REQUEST_TIMEOUT = float(os.environ.get("GNVM_OPENAI_REQUEST_TIMEOUT", 60))
+MAX_RETRIES = int(os.environ.get("GNVM_OPENAI_MAX_RETRIES", 3))
+RETRY_BASE_DELAY = float(os.environ.get("GNVM_OPENAI_RETRY_BASE_DELAY", 1.0))
+RETRY_MAX_DELAY = float(os.environ.get("GNVM_OPENAI_RETRY_MAX_DELAY", 30.0))
+REQUESTS_PER_MINUTE = int(os.environ.get("GNVM_OPENAI_REQUESTS_PER_MINUTE", 0))
+TOKENS_PER_MINUTE = int(os.environ.get("GNVM_OPENAI_TOKENS_PER_MINUTE", 0))
+MAX_WORKERS = int(os.environ.get("GNVM_MAX_WORKERS", 2))
+SUMMARY_MAX_WORKERS = int(os.environ.get("GNVM_SUMMARY_MAX_WORKERS", 4))
+SUMMARY_CHUNK_TOKENS = int(os.environ.get("GNVM_SUMMARY_CHUNK_TOKENS", 0))
+SUMMARY_CHUNK_OVERLAP = int(os.environ.get("GNVM_SUMMARY_CHUNK_OVERLAP", 0))
+SUMMARY_MODE = os.environ.get("GNVM_SUMMARY_MODE", "refine")
+SUMMARY_REDUCE_FAN_IN = int(os.environ.get("GNVM_SUMMARY_REDUCE_FAN_IN", 4))
+SUMMARY_URL_LLM_FALLBACK = int(os.environ.get("GNVM_SUMMARY_URL_LLM_FALLBACK", 0))
+HTTP_TIMEOUT = float(os.environ.get("GNVM_HTTP_TIMEOUT", 30))
+PAGE_MAX_BYTES = int(os.environ.get("GNVM_PAGE_MAX_BYTES", 2 * 1024 * 1024))
+STREAM_RESPONSE = int(os.environ.get("GNVM_STREAM_RESPONSE", 1))
+STREAM_UPDATE_INTERVAL = float(os.environ.get("GNVM_STREAM_UPDATE_INTERVAL", 0.1))
+RENDER_INTERVAL = float(os.environ.get("GNVM_RENDER_INTERVAL", 0.05))
+DATA_DIR = os.environ.get(
+    "GNVM_DATA_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
 CONTEXT_FILE_PATH = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "context.json"
 )
-PROMPT_FILE_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompt.log"
-)
+HISTORY_FILE_PATH = os.path.join(DATA_DIR, "context.jsonl")
+CONTEXT_SUMMARY_FILE_PATH = os.path.join(DATA_DIR, "context_summary.json")
+TOKEN_CACHE_SIZE = int(os.environ.get("GNVM_TOKEN_CACHE_SIZE", 4096))
+HISTORY_PAGE_SIZE = int(os.environ.get("GNVM_HISTORY_PAGE_SIZE", 20))
+PROMPT_FILE_PATH = os.path.join(DATA_DIR, "prompt.log")
+PROMPT_LOG_MAX_BYTES = int(os.environ.get("GNVM_PROMPT_LOG_MAX_BYTES", 5 * 1024 * 1024))
+PROMPT_LOG_BACKUP_COUNT = int(os.environ.get("GNVM_PROMPT_LOG_BACKUP_COUNT", 3))
+PROMPT_LOG_COMPRESS = int(os.environ.get("GNVM_PROMPT_LOG_COMPRESS", 0))
+PROMPT_LOG_PAGE_SIZE = int(os.environ.get("GNVM_PROMPT_LOG_PAGE_SIZE", 20))
+PAGE_CACHE = int(os.environ.get("GNVM_PAGE_CACHE", 1))
+PAGE_CACHE_DIR = os.path.join(DATA_DIR, "page_cache")
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("GNVM_PAGE_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+PAGE_CACHE_TTL = float(os.environ.get("GNVM_PAGE_CACHE_TTL", 3600))
+COMPLETION_CACHE = int(os.environ.get("GNVM_COMPLETION_CACHE", 0))
+COMPLETION_CACHE_FILE_PATH = os.path.join(DATA_DIR, "completion_cache.sqlite3")
+COMPLETION_CACHE_MEMORY_SIZE = int(os.environ.get("GNVM_COMPLETION_CACHE_MEMORY_SIZE", 256))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.environ.get("GNVM_COMPLETION_CACHE_MAX_ENTRIES", 5000))
+COMPLETION_CACHE_TTL = float(os.environ.get("GNVM_COMPLETION_CACHE_TTL", 7 * 24 * 3600))
+TRANSLATION_CACHE = int(os.environ.get("GNVM_TRANSLATION_CACHE", 1))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.environ.get("GNVM_TRANSLATION_CACHE_MAX_ENTRIES", 2000))
+CODE_REVIEW_CACHE = int(os.environ.get("GNVM_CODE_REVIEW_CACHE", 1))
+CODE_REVIEW_CACHE_MAX_ENTRIES = int(os.environ.get("GNVM_CODE_REVIEW_CACHE_MAX_ENTRIES", 5000))
 
 OPENAI_API_MODEL_NAME = os.environ.get("OPENAI_API_MODEL_NAME", "gpt-3.5-turbo")
+FAST_MODEL_NAME = os.environ.get("GNVM_FAST_MODEL_NAME", "gpt-3.5-turbo")
+# Context window, relative latency and USD cost per 1K tokens of each model.
+MODEL_REGISTRY = {
+    "gpt-3.5-turbo": {"context_window": 4097, "latency": 1.0, "cost": 0.0015},
+    "gpt-3.5-turbo-16k": {"context_window": 16385, "latency": 1.2, "cost": 0.003},
+    "gpt-4": {"context_window": 8192, "latency": 3.0, "cost": 0.03},
+    "gpt-4-32k": {"context_window": 32768, "latency": 3.5, "cost": 0.06},
+}
+MODEL_REGISTRY.update(json.loads(os.environ.get("GNVM_MODEL_REGISTRY", "{}")))
+# Candidate models per task; requests no candidate fits overflow to the
+# fastest registered model that fits when GNVM_MODEL_AUTO_SELECT is on.
+MODEL_ROUTES = {
+    "chat": [OPENAI_API_MODEL_NAME],
+    "code_review": [OPENAI_API_MODEL_NAME],
+    "translate": [FAST_MODEL_NAME],
+    "find_urls": [FAST_MODEL_NAME],
+    "summary": [FAST_MODEL_NAME],
+    "history_summary": [FAST_MODEL_NAME],
+}
+MODEL_ROUTES.update(json.loads(os.environ.get("GNVM_MODEL_ROUTES", "{}")))
+MODEL_ROUTE_LOG_SIZE = int(os.environ.get("GNVM_MODEL_ROUTE_LOG_SIZE", 100))
 MAX_TOKENS_SIZE = {
-    "gpt-3.5-turbo": 4097,
-    "gpt-4": 2048,
-    "gpt-3.5-turbo-16k": 16384,
+    name: spec["context_window"] for name, spec in MODEL_REGISTRY.items()
 }
-MODEL_NAME_FOR_LONG_MESSAGES = "gpt-3.5-turbo-16k"
 ALLOWED_MODELS = list(MAX_TOKENS_SIZE.keys())
+SUMMARY_MODES = ["refine", "map_reduce"]
+PRIOR_CONVERSATION_MODES = ["recent", "relevant"]
 
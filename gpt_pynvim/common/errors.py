@@ -2,6 +2,10 @@ class ChatCompletionError(Exception):
     pass
 
 
+class ChatCompletionCancelled(ChatCompletionError):
+    pass
+
+
 class ChatMessagesError(Exception):
     pass
 
@@ -20,3 +24,7 @@ class CodeReviewError(Exception):
 
 class TranslateError(Exception):
     pass
+
+
+class HistorySummaryError(Exception):
+    pass
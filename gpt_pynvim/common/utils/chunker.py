@@ -0,0 +1,89 @@
+import re
+from typing import Callable, Iterator
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s")
+PARAGRAPH_SEPARATOR = re.compile(r"\n\s*\n")
+SENTENCE_SEPARATOR = re.compile(r"(?<=[.!?。！？])\s+")
+CODE_FENCE = "```"
+
+
+def iter_paragraphs(text: str) -> Iterator[str]:
+    start = 0
+    pending = ""
+    for match in PARAGRAPH_SEPARATOR.finditer(text):
+        paragraph = text[start: match.start()]
+        start = match.end()
+        pending = f"{pending}\n\n{paragraph}" if pending else paragraph
+        # Keep fenced code blocks in one piece even if they contain blank lines.
+        if pending.count(CODE_FENCE) % 2 == 0:
+            if pending.strip():
+                yield pending.strip()
+            pending = ""
+    paragraph = text[start:]
+    pending = f"{pending}\n\n{paragraph}" if pending else paragraph
+    if pending.strip():
+        yield pending.strip()
+
+
+def split_oversized(text: str, max_tokens: int,
+                    count_tokens: Callable[[str], int]) -> Iterator[str]:
+    if count_tokens(text) <= max_tokens:
+        yield text
+        return
+    sentences = SENTENCE_SEPARATOR.split(text)
+    if len(sentences) > 1:
+        for sentence in sentences:
+            yield from split_oversized(sentence, max_tokens, count_tokens)
+        return
+    words = text.split(" ")
+    if len(words) == 1:
+        # No boundary left to split on, fall back to characters.
+        step = max(len(text) * max_tokens // count_tokens(text), 1)
+        for i in range(0, len(text), step):
+            yield text[i: i + step]
+        return
+    middle = len(words) // 2
+    yield from split_oversized(" ".join(words[:middle]), max_tokens, count_tokens)
+    yield from split_oversized(" ".join(words[middle:]), max_tokens, count_tokens)
+
+
+def iter_token_chunks(text: str, max_tokens: int,
+                      count_tokens: Callable[[str], int],
+                      overlap_tokens: int = 0) -> Iterator[str]:
+    """Yield chunks of `text` packed up to `max_tokens` tokens each.
+
+    Chunks are split on heading, paragraph and sentence boundaries, in that
+    order of preference, and may repeat up to `overlap_tokens` tokens of the
+    previous chunk for context.
+    """
+    units = []
+    unit_tokens = 0
+    for paragraph in iter_paragraphs(text):
+        for piece in split_oversized(paragraph, max_tokens, count_tokens):
+            piece_tokens = count_tokens(piece) + 1
+            starts_section = HEADING_PATTERN.match(piece) is not None
+            if units and (
+                unit_tokens + piece_tokens > max_tokens
+                or (starts_section and unit_tokens > max_tokens // 2)
+            ):
+                yield "\n\n".join(units)
+                units, unit_tokens = _overlap(units, overlap_tokens, count_tokens)
+                while units and unit_tokens + piece_tokens > max_tokens:
+                    unit_tokens -= count_tokens(units.pop(0)) + 1
+            units.append(piece)
+            unit_tokens += piece_tokens
+    if units:
+        yield "\n\n".join(units)
+
+
+def _overlap(units: list[str], overlap_tokens: int,
+             count_tokens: Callable[[str], int]) -> tuple[list[str], int]:
+    kept = []
+    kept_tokens = 0
+    for unit in reversed(units):
+        unit_tokens = count_tokens(unit) + 1
+        if kept_tokens + unit_tokens > overlap_tokens:
+            break
+        kept.insert(0, unit)
+        kept_tokens += unit_tokens
+    return kept, kept_tokens
@@ -0,0 +1,133 @@
+import ast
+import re
+import textwrap
+from typing import Callable, NamedTuple
+
+CLOSING_PATTERN = re.compile(r"^\s*([\]\)}]|end\b|fi\b|done\b|esac\b)")
+DEFINITION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class CodeUnit(NamedTuple):
+    name: str
+    start_line: int
+    end_line: int
+    text: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.name} (lines {self.start_line}-{self.end_line})"
+
+
+def _unit(lines: list[str], name: str, start: int, end: int) -> CodeUnit:
+    return CodeUnit(name, start + 1, end, "\n".join(lines[start:end]))
+
+
+def split_python(code: str) -> list[CodeUnit]:
+    """Splits Python source at top-level function and class boundaries.
+
+    Top-level statements between definitions become "module" units. Returns
+    an empty list when the code does not parse or defines nothing.
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except (SyntaxError, ValueError):
+        return []
+    if not any(isinstance(node, DEFINITION_TYPES) for node in tree.body):
+        return []
+    lines = code.split("\n")
+    units = []
+    cursor = 0
+    has_statements = False
+    for node in tree.body:
+        if not isinstance(node, DEFINITION_TYPES):
+            has_statements = True
+            continue
+        start = min([node.lineno - 1] + [d.lineno - 1 for d in node.decorator_list])
+        if has_statements:
+            units.append(_unit(lines, "module", cursor, start))
+            cursor = start
+            has_statements = False
+        # Comments and blank lines before a definition stay with it.
+        units.append(_unit(lines, node.name, cursor, node.end_lineno))
+        cursor = node.end_lineno
+    if any(line.strip() for line in lines[cursor:]):
+        units.append(_unit(lines, "module", cursor, len(lines)))
+    return units
+
+
+def split_by_indentation(code: str) -> list[CodeUnit]:
+    """Splits code of any language where it returns to its base indentation.
+
+    A base-indentation line starts a new unit once the current unit has an
+    indented body, unless it only closes the block (`}`, `end`, ...).
+    """
+    lines = code.split("\n")
+    indents = [
+        len(line) - len(line.lstrip()) for line in lines if line.strip()
+    ]
+    if not indents:
+        return []
+    base = min(indents)
+    units = []
+    start = None
+    has_body = False
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        indent = len(line) - len(line.lstrip())
+        if start is None:
+            start = i
+        elif indent == base and has_body and not CLOSING_PATTERN.match(line):
+            units.append(_unit(lines, lines[start].strip()[:40], start, i))
+            start = i
+            has_body = False
+        if indent > base:
+            has_body = True
+    units.append(_unit(lines, lines[start].strip()[:40], start, len(lines)))
+    return units
+
+
+def split_code(code: str) -> list[CodeUnit]:
+    return split_python(code) or split_by_indentation(code)
+
+
+def pack_units(units: list[CodeUnit], count_tokens: Callable[[str], int],
+               max_tokens: int,
+               boundary: Callable[[CodeUnit], bool] = None) -> list[CodeUnit]:
+    """Merges neighbouring units until each group reaches `max_tokens`.
+
+    A unit for which `boundary` returns True always starts a new group, so
+    an edit to one unit only regroups the units up to the next boundary.
+    """
+    packed = []
+    for unit in units:
+        if packed and not (boundary and boundary(unit)):
+            last = packed[-1]
+            text = f"{last.text}\n{unit.text}"
+            if count_tokens(text) <= max_tokens:
+                packed[-1] = CodeUnit(
+                    f"{last.name}, {unit.name}", last.start_line, unit.end_line, text
+                )
+                continue
+        packed.append(unit)
+    return packed
+
+
+def outline(code: str, units: list[CodeUnit]) -> str:
+    """Imports plus the first line of every unit, shared with each review."""
+    lines = [
+        line for line in code.split("\n")
+        if re.match(r"\s*(import|from\s+\S+\s+import|#include|using|require)\b", line)
+    ]
+    for unit in units:
+        if unit.name == "module":
+            continue
+        signature = next(
+            (
+                line for line in unit.text.split("\n")
+                if line.strip() and not line.lstrip().startswith(("#", "@", "//"))
+            ),
+            "",
+        )
+        lines.append(f"{signature.rstrip()}  # lines {unit.start_line}-{unit.end_line}")
+    return "\n".join(lines)
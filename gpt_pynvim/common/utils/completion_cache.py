@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator
+
+KEY_OPTIONS = ("messages", "model", "temperature", "max_tokens", "functions",
+               "function_call")
+
+
+class CompletionCache:
+    """Two-tier cache of chat completion responses and other model output.
+
+    Values are kept in an in-memory LRU in front of a SQLite store. Hits
+    refresh the rows' `last_used` column in a batch on the next `put`, so a
+    hit never writes, and each namespace evicts its least recently used rows. The "completion" namespace keys responses by a
+    hash of the canonicalized request and only caches deterministic requests
+    (temperature 0); other namespaces, such as translations and code reviews,
+    store text under `text_key`.
+    """
+
+    def __init__(self, file_path: str, enabled: bool = False,
+                 memory_size: int = 256, max_entries: int = 5000,
+                 ttl: float = 0, namespace: str = "completion"):
+        self._file_path = file_path
+        self._namespace = namespace
+        self._memory_size = memory_size
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._db = None
+        self._lock = threading.Lock()
+        self.enabled = enabled
+        self.bypass = False
+        self.hits = 0
+        self.misses = 0
+
+    def accepts(self, options: dict[str, Any]) -> bool:
+        return self.enabled and not self.bypass and not options.get("temperature")
+
+    def key(self, options: dict[str, Any]) -> str:
+        canonical = {name: options.get(name) for name in KEY_OPTIONS}
+        data = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def text_key(self, *parts: str) -> str:
+        data = "\0".join((self._namespace,) + parts)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._connect().execute(
+                    "SELECT created_at, response FROM completions WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                entry = (row[0], json.loads(row[1])) if row else None
+            if entry is None or self._expired(entry[0]):
+                self.misses += 1
+                return None
+            self._touched[key] = time.time()
+            self._remember(key, entry)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: Any):
+        if not self.enabled:
+            return
+        entry = (time.time(), json.loads(json.dumps(response)))
+        with self._lock:
+            self._remember(key, entry)
+            db = self._connect()
+            db.executemany(
+                "UPDATE completions SET last_used = ? WHERE key = ?",
+                [(used_at, touched) for touched, used_at in self._touched.items()],
+            )
+            self._touched.clear()
+            db.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, created_at, response, last_used, namespace) VALUES (?, ?, ?, ?, ?)",
+                (key, entry[0], json.dumps(entry[1]), entry[0], self._namespace),
+            )
+            db.execute(
+                "DELETE FROM completions WHERE namespace = ? AND key NOT IN ("
+                "SELECT key FROM completions WHERE namespace = ? "
+                "ORDER BY last_used DESC LIMIT ?)",
+                (self._namespace, self._namespace, self._max_entries),
+            )
+            db.commit()
+
+    def put_stream(self, key: str,
+                   chunks: Iterator[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        contents = []
+        finish_reason = None
+        for chunk in chunks:
+            choice = chunk["choices"][0]
+            contents.append(choice["delta"].get("content") or "")
+            finish_reason = choice.get("finish_reason") or finish_reason
+            yield chunk
+        self.put(key, {
+            "choices": [{
+                "message": {"role": "assistant", "content": "".join(contents)},
+                "finish_reason": finish_reason,
+            }]
+        })
+
+    def as_stream(self, response: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        choice = response["choices"][0]
+        yield {
+            "choices": [{
+                "delta": {"content": choice["message"].get("content") or ""},
+                "finish_reason": choice["finish_reason"],
+            }]
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            db = self._connect()
+            db.execute("DELETE FROM completions WHERE namespace = ?", (self._namespace,))
+            db.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "bypass": self.bypass,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self._ttl) and time.time() - created_at > self._ttl
+
+    def _remember(self, key: str, entry: tuple[float, dict[str, Any]]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self._file_path, check_same_thread=False)
+            # The translation and review caches share the file with their own
+            # connections, so let readers run alongside a writer.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, created_at REAL, response TEXT, last_used REAL, "
+                "namespace TEXT DEFAULT 'completion')"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(completions)")]
+            if "last_used" not in columns:
+                # Stores written before LRU eviction only have created_at.
+                self._db.execute("ALTER TABLE completions ADD COLUMN last_used REAL")
+                self._db.execute("UPDATE completions SET last_used = created_at")
+            if "namespace" not in columns:
+                self._db.execute(
+                    "ALTER TABLE completions ADD COLUMN namespace TEXT DEFAULT 'completion'"
+                )
+            self._db.commit()
+        return self._db
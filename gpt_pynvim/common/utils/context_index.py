@@ -0,0 +1,117 @@
+import bisect
+import math
+import re
+import threading
+from collections import Counter
+
+from .history_store import HistoryStore
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over documents that can be added and removed one at a time."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self._k1 = k1
+        self._b = b
+        self._terms = {}
+        self._lengths = {}
+        self._postings = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self._terms
+
+    def add(self, doc_id, terms: list[str]):
+        if doc_id in self._terms:
+            self.remove(doc_id)
+        counts = Counter(terms)
+        self._terms[doc_id] = counts
+        self._lengths[doc_id] = len(terms)
+        self._total_length += len(terms)
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id):
+        counts = self._terms.pop(doc_id, None)
+        if counts is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in counts:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def scores(self, terms: list[str]) -> dict:
+        if not self._terms:
+            return {}
+        doc_count = len(self._terms)
+        average_length = self._total_length / doc_count or 1
+        scores = {}
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, count in postings.items():
+                length = self._lengths[doc_id]
+                norm = self._k1 * (1 - self._b + self._b * length / average_length)
+                scores[doc_id] = (
+                    scores.get(doc_id, 0.0)
+                    + idf * count * (self._k1 + 1) / (count + norm)
+                )
+        return scores
+
+
+class ContextIndex:
+    """BM25 index over the turns of a HistoryStore, keyed by record offset.
+
+    `update` only reads records appended since the last call and drops
+    turns that have slid out of the store's window, so the index stays in
+    step with the history as turns are saved.
+    """
+
+    def __init__(self, store: HistoryStore):
+        self._store = store
+        self._index = BM25Index()
+        self._generation = None
+        self._offsets = []
+        self._lock = threading.Lock()
+
+    def update(self):
+        with self._lock:
+            generation, offsets = self._store.snapshot()
+            if generation != self._generation:
+                self._generation = generation
+                self._index = BM25Index()
+                self._offsets = []
+            oldest = offsets[0] if offsets else None
+            while self._offsets and (oldest is None or self._offsets[0] < oldest):
+                self._index.remove(self._offsets.pop(0))
+            last = self._offsets[-1] if self._offsets else -1
+            new_offsets = offsets[bisect.bisect_right(offsets, last):]
+            records = self._store.read(new_offsets, self._generation)
+            if records is None:
+                # Replaced since `offsets`; the next update rebuilds.
+                return
+            for offset, record in zip(new_offsets, records):
+                text = " ".join(message["content"] for message in record["turn"])
+                self._index.add(offset, tokenize(text))
+                self._offsets.append(offset)
+
+    def rank(self, query: str) -> list[int]:
+        """Returns the offsets of turns sharing a term with `query`, best first."""
+        self.update()
+        with self._lock:
+            scores = self._index.scores(tokenize(query))
+        # Newer turns win ties.
+        return sorted(scores, key=lambda offset: (scores[offset], offset), reverse=True)
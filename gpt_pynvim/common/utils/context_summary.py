@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+
+def record_key(record: dict[str, Any]) -> str:
+    data = json.dumps([record.get("created_at"), record["turn"]], sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class ContextSummary:
+    """Running summary of the history turns that aged out of the prompt.
+
+    Stored as `{"summary": ..., "last_key": ..., "tokens": ...}`, where
+    `last_key` identifies the newest history record folded into it.
+    """
+
+    def __init__(self, file_path: str):
+        self._file_path = file_path
+        self._data = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    def load(self) -> dict[str, Any]:
+        with self._lock:
+            try:
+                mtime = os.stat(self._file_path).st_mtime_ns
+            except FileNotFoundError:
+                self._data, self._mtime = {}, None
+                return {}
+            if mtime != self._mtime:
+                try:
+                    with open(self._file_path) as f:
+                        self._data = json.load(f)
+                except ValueError:
+                    self._data = {}
+                self._mtime = mtime
+            return dict(self._data)
+
+    def save(self, summary: str, last_key: str, tokens: int):
+        data = {"summary": summary, "last_key": last_key, "tokens": tokens}
+        tmp_path = f"{self._file_path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._file_path)
+            self._data, self._mtime = None, None
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self._file_path)
+            except FileNotFoundError:
+                pass
+            self._data, self._mtime = None, None
@@ -3,60 +3,88 @@ import json
 import datetime
 from ..config import (
     CONTEXT_FILE_PATH,
-    PROMPT_FILE_PATH
+    CONTEXT_SUMMARY_FILE_PATH,
+    HISTORY_FILE_PATH,
+    PROMPT_FILE_PATH,
+    PROMPT_LOG_MAX_BYTES,
+    PROMPT_LOG_BACKUP_COUNT,
+    PROMPT_LOG_COMPRESS,
+    PROMPT_LOG_PAGE_SIZE,
+)
+from .context_summary import ContextSummary
+from .history_store import HistoryStore
+from .prompt_log import PromptLog
+
+
+history_store = HistoryStore(HISTORY_FILE_PATH)
+context_summary = ContextSummary(CONTEXT_SUMMARY_FILE_PATH)
+prompt_log = PromptLog(
+    PROMPT_FILE_PATH,
+    max_bytes=PROMPT_LOG_MAX_BYTES,
+    backup_count=PROMPT_LOG_BACKUP_COUNT,
+    compress=bool(PROMPT_LOG_COMPRESS),
 )
-
-
-def save_context_to_file(context: dict):
-    with open(CONTEXT_FILE_PATH, "w") as f:
-        json.dump(context, f)
 
 
 def load_context_from_file() -> dict[str, list]:
-    with open(CONTEXT_FILE_PATH, "r") as f:
-        return json.load(f)
+    return {"context": history_store.turns()}
 
 
 def clear_context_file():
-    with open(CONTEXT_FILE_PATH, "w") as f:
-        json.dump({"context": []}, f)
+    history_store.clear()
+    context_summary.clear()
 
 
-def save_prompt_to_file(system_message: str = "", user_message: str = "",
-                        assistant_reply: str = ""):
-    with open(PROMPT_FILE_PATH, "a") as log_file:
-        log_file.write(f"=={datetime.datetime.now()}]==\n")
-        if system_message:
-            log_file.write(f"[System]\n{system_message}\n")
-        if user_message:
-            log_file.write(f"[User]\n{user_message}\n")
-        if assistant_reply:
-            log_file.write(f"[Assistant]\n{assistant_reply}\n")
+def migrate_context_file():
+    if os.path.exists(HISTORY_FILE_PATH) or not os.path.exists(CONTEXT_FILE_PATH):
+        return
+    with open(CONTEXT_FILE_PATH, "r") as f:
+        history_store.import_turns(json.load(f).get("context", []))
 
 
-def load_prompt_from_file():
-    with open(PROMPT_FILE_PATH, "r") as f:
-        return f.read()
+def save_prompt_to_file(system_message: str = "", user_message: str = "",
+                        assistant_reply: str = ""):
+    entry = f"=={datetime.datetime.now()}]==\n"
+    if system_message:
+        entry += f"[System]\n{system_message}\n"
+    if user_message:
+        entry += f"[User]\n{user_message}\n"
+    if assistant_reply:
+        entry += f"[Assistant]\n{assistant_reply}\n"
+    prompt_log.write(entry)
+
+
+def load_prompt_from_file(page: int = None,
+                          page_size: int = PROMPT_LOG_PAGE_SIZE) -> tuple[str, int, int]:
+    entry_count = prompt_log.entry_count()
+    page_count = max((entry_count + page_size - 1) // page_size, 1)
+    if page is None or page >= page_count:
+        page = page_count - 1
+    page = max(page, 0)
+    text = prompt_log.read_entries(page * page_size, page_size)
+    return text, page, page_count
 
 
 def clear_prompt_file():
-    with open(PROMPT_FILE_PATH, "w") as f:
-        f.write("")
+    prompt_log.clear()
 
 
-if not os.path.exists(CONTEXT_FILE_PATH):
+if not os.path.exists(HISTORY_FILE_PATH):
     try:
-        save_context_to_file({"context": []})
+        os.makedirs(os.path.dirname(HISTORY_FILE_PATH), exist_ok=True)
+        migrate_context_file()
+        if not os.path.exists(HISTORY_FILE_PATH):
+            history_store.clear()
     except Exception as e:
         print("Error: Can't create context file:", e)
-        print(f"CONTEXT_FILE_PATH: {CONTEXT_FILE_PATH}")
-        print("Please check if you have write permission to the plugin directory")
+        print(f"HISTORY_FILE_PATH: {HISTORY_FILE_PATH}")
+        print("Please check if you have write permission to GNVM_DATA_DIR")
         exit(1)
 
 
 if not os.path.exists(PROMPT_FILE_PATH):
     try:
-        save_prompt_to_file("")
+        clear_prompt_file()
     except Exception as e:
         print("Error: Can't create prompt log file:", e)
         print(f"PROMPT_FILE_PATH: {PROMPT_FILE_PATH}")
@@ -0,0 +1,184 @@
+import contextlib
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ..config import CONTEXT_HISTORY_SIZE
+
+
+class HistoryStore:
+    """Append-only JSONL store for conversation turns.
+
+    Each line is one record: `{"created_at": ..., "turn": [...], ...}`.
+    Appends write a single line, reads pick up only the bytes appended since
+    the last refresh, and the file is compacted down to `max_size` records
+    once it holds twice as many. A sidecar lock file serializes writers
+    across Neovim instances.
+    """
+
+    def __init__(self, file_path: str, max_size: int = CONTEXT_HISTORY_SIZE,
+                 cache_size: int = 256):
+        self._file_path = file_path
+        self._lock_path = f"{file_path}.lock"
+        self._max_size = max(max_size, 1)
+        self._cache_size = cache_size
+        self._offsets = []
+        self._cache = OrderedDict()
+        self._file_id = None
+        self._file_size = 0
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever the file is replaced, invalidating old offsets."""
+        with self._lock:
+            return self._generation
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.refresh()
+            return min(len(self._offsets), self._max_size)
+
+    @contextlib.contextmanager
+    def file_lock(self, exclusive: bool = True) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        with self._lock, self.file_lock(exclusive=False):
+            self._refresh()
+
+    def records(self, size: int = None, start: int = None) -> list[dict[str, Any]]:
+        with self._lock, self.file_lock(exclusive=False):
+            self._refresh()
+            return self._records(size, start)
+
+    def offsets(self) -> list[int]:
+        return self.snapshot()[1]
+
+    def snapshot(self) -> tuple[int, list[int]]:
+        """Returns the generation together with the offsets valid in it."""
+        with self._lock, self.file_lock(exclusive=False):
+            self._refresh()
+            return self._generation, self._offsets[-self._max_size:]
+
+    def read(self, offsets: list[int], generation: int = None) -> list[dict[str, Any]]:
+        """Reads the records at `offsets`.
+
+        Returns None when `generation` is given and the file has been
+        replaced since, because the offsets then point into the new file.
+        """
+        with self._lock, self.file_lock(exclusive=False):
+            self._refresh()
+            if generation is not None and generation != self._generation:
+                return None
+            return [self._read(offset) for offset in offsets]
+
+    def turns(self, size: int = None) -> list[list[dict[str, str]]]:
+        return [record["turn"] for record in self.records(size)]
+
+    def append(self, turn: list[dict[str, str]], **fields: Any):
+        record = {
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "turn": turn,
+            **fields,
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock, self.file_lock():
+            with open(self._file_path, "a") as f:
+                f.write(line)
+            self._refresh()
+            if len(self._offsets) >= self._max_size * 2:
+                self._compact()
+
+    def clear(self):
+        with self._lock, self.file_lock():
+            self._replace([])
+
+    def import_turns(self, turns: list[list[dict[str, str]]]):
+        records = [{"created_at": None, "turn": turn} for turn in turns]
+        with self._lock, self.file_lock():
+            self._replace(records[-self._max_size:])
+
+    def _reset(self, file_id: tuple[int, int] = None):
+        self._file_id = file_id
+        self._file_size = 0
+        self._generation += 1
+        self._offsets = []
+        self._cache.clear()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self._file_path)
+        except FileNotFoundError:
+            self._reset(None)
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._file_size:
+            self._reset(file_id)
+        if stat.st_size > self._file_size:
+            self._scan()
+
+    def _records(self, size: int = None, start: int = None) -> list[dict[str, Any]]:
+        offsets = self._offsets[-self._max_size:]
+        if start is None:
+            start = len(offsets) - size if size else 0
+        start = max(start, 0)
+        end = len(offsets) if size is None else start + size
+        return [self._read(offset) for offset in offsets[start:end]]
+
+    def _scan(self):
+        with open(self._file_path, "rb") as f:
+            f.seek(self._file_size)
+            offset = self._file_size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    self._offsets.append(offset)
+                offset += len(line)
+            self._file_size = offset
+
+    def _read(self, offset: int) -> dict[str, Any]:
+        if offset in self._cache:
+            self._cache.move_to_end(offset)
+            return self._cache[offset]
+        with open(self._file_path, "rb") as f:
+            f.seek(offset)
+            record = json.loads(f.readline())
+        self._cache[offset] = record
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def _compact(self):
+        self._replace(self._records(self._max_size))
+
+    def _replace(self, records: list[dict[str, Any]]):
+        tmp_path = f"{self._file_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self._file_path)
+        self._reset(None)
+        self._refresh()
@@ -0,0 +1,171 @@
+import bisect
+import re
+import threading
+from typing import Any
+
+from ..config import HISTORY_PAGE_SIZE
+from .history_store import HistoryStore
+
+WORD_PATTERN = re.compile(r"\w+")
+PREVIEW_LENGTH = 80
+
+
+class HistoryIndex:
+    """Date and keyword index over the records of a HistoryStore.
+
+    Built on first use and then extended with only the records appended
+    since. Entries are keyed by byte offset, so the index stays valid until
+    the store rewrites its file.
+    """
+
+    def __init__(self, store: HistoryStore):
+        self._store = store
+        self._generation = None
+        self._offsets = []
+        self._dates = []
+        self._words = {}
+
+    def update(self):
+        generation, offsets = self._store.snapshot()
+        if generation != self._generation:
+            self._generation = generation
+            self._offsets = []
+            self._dates = []
+            self._words = {}
+        last = self._offsets[-1] if self._offsets else -1
+        new_offsets = offsets[bisect.bisect_right(offsets, last):]
+        records = self._store.read(new_offsets, self._generation)
+        if records is None:
+            # Replaced since `offsets`; the next update rebuilds.
+            return
+        for offset, record in zip(new_offsets, records):
+            self._offsets.append(offset)
+            self._dates.append(record.get("created_at") or "")
+            text = " ".join(message["content"] for message in record["turn"])
+            for word in set(WORD_PATTERN.findall(text.lower())):
+                self._words.setdefault(word, []).append(offset)
+
+    def search(self, query: str) -> list[int]:
+        self.update()
+        words = WORD_PATTERN.findall(query.lower())
+        if not words:
+            return []
+        matches = set(self._words.get(words[0], []))
+        for word in words[1:]:
+            matches.intersection_update(self._words.get(word, []))
+        return sorted(matches)
+
+    def first_on_or_after(self, date: str) -> int:
+        self.update()
+        i = bisect.bisect_left(self._dates, date)
+        return self._offsets[i] if i < len(self._offsets) else None
+
+
+class HistoryViewer:
+    """Pages through a HistoryStore without loading the whole history.
+
+    Only the records on the current page are read from the store, and each
+    turn is shown as a one-line preview until it is expanded.
+    """
+
+    def __init__(self, store: HistoryStore, page_size: int = HISTORY_PAGE_SIZE):
+        self._store = store
+        self._page_size = max(page_size, 1)
+        self._index = HistoryIndex(store)
+        self._page = None
+        self._query = ""
+        self._matches = None
+        self._expanded = set()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._page = None
+            self._query = ""
+            self._matches = None
+            self._expanded.clear()
+
+    def page(self, step: int):
+        with self._lock:
+            if self._page is not None:
+                self._page = max(self._page + step, 0)
+
+    def search(self, query: str):
+        with self._lock:
+            self._query = query.strip()
+            self._matches = self._index.search(self._query) if self._query else None
+            self._page = None
+
+    def jump_to_date(self, date: str) -> bool:
+        with self._lock:
+            offset = self._index.first_on_or_after(date.strip())
+            if offset is None:
+                return False
+            self._query = ""
+            self._matches = None
+            entries = self._entries()
+            self._page = bisect.bisect_left(entries, offset) // self._page_size
+            return True
+
+    def toggle(self, number: int) -> bool:
+        with self._lock:
+            offsets = self._store.offsets()
+            if not 1 <= number <= len(offsets):
+                return False
+            self._expanded ^= {offsets[number - 1]}
+            return True
+
+    def render(self) -> tuple[str, int, int]:
+        with self._lock:
+            offsets = self._store.offsets()
+            entries = self._entries(offsets)
+            page_count = max(
+                (len(entries) + self._page_size - 1) // self._page_size, 1
+            )
+            if self._page is None or self._page >= page_count:
+                self._page = page_count - 1
+            start = self._page * self._page_size
+            page_offsets = entries[start:start + self._page_size]
+            header = f"[History page {self._page + 1}/{page_count}] {len(entries)} turns"
+            if self._query:
+                header += f' matching "{self._query}"'
+            lines = [header]
+            for offset, record in zip(page_offsets, self._store.read(page_offsets)):
+                number = bisect.bisect_left(offsets, offset) + 1
+                lines.extend(self.format_record(
+                    number, record, offset in self._expanded
+                ))
+            return "\n".join(lines), self._page, page_count
+
+    def _entries(self, offsets: list[int] = None) -> list[int]:
+        if offsets is None:
+            offsets = self._store.offsets()
+        if self._store.generation != self._generation:
+            self._generation = self._store.generation
+            self._expanded.clear()
+            if self._query:
+                self._matches = self._index.search(self._query)
+        if self._matches is None:
+            return offsets
+        oldest = offsets[0] if offsets else 0
+        return [offset for offset in self._matches if offset >= oldest]
+
+    @staticmethod
+    def format_record(number: int, record: dict[str, Any],
+                      expanded: bool = False) -> list[str]:
+        created_at = record.get("created_at") or "-"
+        messages = {m["role"]: m["content"] for m in record["turn"]}
+        if expanded:
+            return [
+                f"[{number}] {created_at}",
+                f"Q:{messages.get('user', '')}",
+                f"A:{messages.get('assistant', '')}",
+            ]
+        question = next(
+            (line for line in messages.get("user", "").splitlines() if line.strip()),
+            "",
+        ).strip()
+        if len(question) > PREVIEW_LENGTH:
+            question = question[:PREVIEW_LENGTH] + "..."
+        return [f"[{number}] {created_at} Q: {question}"]
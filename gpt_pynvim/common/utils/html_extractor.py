@@ -0,0 +1,89 @@
+import re
+import time
+from importlib.util import find_spec
+from typing import Iterator
+
+from bs4 import BeautifulSoup
+from markdownify import markdownify as md
+
+# lxml parses large pages several times faster than the stdlib parser.
+HTML_PARSER = "lxml" if find_spec("lxml") else "html.parser"
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+TEXT_CONTENT_TYPES = ("text/plain", "text/markdown")
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas",
+    "nav", "header", "footer", "aside", "form", "button", "select",
+]
+BOILERPLATE_ROLES = ["navigation", "banner", "contentinfo", "complementary", "search"]
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+def media_type(content_type: str) -> str:
+    return content_type.split(";")[0].strip().lower()
+
+
+def is_supported_content_type(content_type: str) -> bool:
+    # A missing header is treated as HTML, as browsers do.
+    return not content_type or media_type(content_type) in (
+        HTML_CONTENT_TYPES + TEXT_CONTENT_TYPES
+    )
+
+
+def read_limited(chunks: Iterator[bytes], max_bytes: int) -> tuple[bytes, bool]:
+    """Reads at most `max_bytes` (0 for no limit) and reports truncation."""
+    body = bytearray()
+    for chunk in chunks:
+        body.extend(chunk)
+        if max_bytes and len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), True
+    return bytes(body), False
+
+
+def decode_body(body: bytes, content_type: str) -> str:
+    match = re.search(r"charset=([\w-]+)", content_type or "", re.IGNORECASE)
+    if not match:
+        match = CHARSET_PATTERN.search(body[:4096])
+    encoding = match.group(1) if match else "utf-8"
+    if isinstance(encoding, bytes):
+        encoding = encoding.decode("ascii")
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def extract_page(body: bytes, content_type: str = "") -> tuple[str, str, dict[str, float]]:
+    """Returns `(title, markdown, timings)` for a downloaded page.
+
+    Boilerplate such as scripts, navigation and footers is removed and only
+    the `<main>`/`<article>` content (or the body) is converted to markdown.
+    """
+    timings = {}
+    started_at = time.perf_counter()
+    text = decode_body(body, content_type)
+    if media_type(content_type) in TEXT_CONTENT_TYPES:
+        timings["decode"] = time.perf_counter() - started_at
+        return "", text, timings
+
+    soup = BeautifulSoup(text, HTML_PARSER)
+    timings["parse"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(attrs={"role": BOILERPLATE_ROLES}):
+        tag.decompose()
+    main = (
+        soup.find("main")
+        or soup.find(attrs={"role": "main"})
+        or soup.find("article")
+        or soup.body
+        or soup
+    )
+    timings["extract"] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    markdown = md(str(main), heading_style="ATX", strip=["a", "img"])
+    timings["markdown"] = time.perf_counter() - started_at
+    return title, markdown, timings
@@ -0,0 +1,169 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+INTERACTIVE = 0
+BACKGROUND = 10
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_local = threading.local()
+
+
+def current_job() -> "Job":
+    return getattr(_local, "job", None)
+
+
+class Job:
+
+    def __init__(self, job_id: int, name: str, window_name: str, priority: int,
+                 target: Callable[..., Any], args: tuple):
+        self.job_id = job_id
+        self.name = name
+        self.window_name = window_name
+        self.priority = priority
+        self.target = target
+        self.args = args
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def priority_name(self) -> str:
+        return PRIORITY_NAMES.get(self.priority, str(self.priority))
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return time.monotonic() - self.created_at
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class JobScheduler:
+    """Bounded worker pool for plugin requests.
+
+    Queued jobs run in priority order. With two or more workers, background
+    jobs occupy at most `max_workers - 1` of them, so an interactive job
+    never waits behind background work. A single worker runs everything in
+    priority order.
+    Only one job runs per window at a time, because a window's session and
+    buffer are not safe to share between concurrent requests.
+    """
+
+    def __init__(self, max_workers: int = 2, history_size: int = 50,
+                 on_error: Callable[[Job], None] = None):
+        self._on_error = on_error
+        self._max_workers = max(max_workers, 1)
+        self._max_background = max(self._max_workers - 1, 1)
+        self._history_size = history_size
+        self._queue = []
+        self._jobs = OrderedDict()
+        self._running_windows = set()
+        self._running_background = 0
+        self._workers = []
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+
+    def submit(self, name: str, target: Callable[..., Any], *args: Any,
+               window_name: str = None, priority: int = INTERACTIVE) -> Job:
+        with self._condition:
+            job = Job(next(self._ids), name, window_name, priority, target, args)
+            self._queue.append(job)
+            self._queue.sort(key=lambda j: (j.priority, j.job_id))
+            self._jobs[job.job_id] = job
+            self._trim_history()
+            self._ensure_workers()
+            self._condition.notify_all()
+            return job
+
+    def cancel(self, job_id: int = None) -> list[Job]:
+        cancelled = []
+        with self._condition:
+            for job in self._jobs.values():
+                if job_id is not None and job.job_id != job_id:
+                    continue
+                if job.status == "queued":
+                    self._queue.remove(job)
+                    job.status = "cancelled"
+                    job.finished_at = time.monotonic()
+                elif job.status != "running":
+                    continue
+                job.cancel_event.set()
+                cancelled.append(job)
+            self._condition.notify_all()
+        return cancelled
+
+    def jobs(self) -> list[Job]:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def _ensure_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _trim_history(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status not in ("queued", "running")
+        ]
+        for job_id in finished[:max(len(self._jobs) - self._history_size, 0)]:
+            del self._jobs[job_id]
+
+    def _runnable(self, job: Job) -> bool:
+        if job.window_name and job.window_name in self._running_windows:
+            return False
+        if job.priority > INTERACTIVE:
+            return self._running_background < self._max_background
+        return True
+
+    def _next_job(self) -> Job:
+        with self._condition:
+            while True:
+                for job in self._queue:
+                    if self._runnable(job):
+                        self._queue.remove(job)
+                        job.status = "running"
+                        job.started_at = time.monotonic()
+                        if job.window_name:
+                            self._running_windows.add(job.window_name)
+                        if job.priority > INTERACTIVE:
+                            self._running_background += 1
+                        return job
+                self._condition.wait()
+
+    def _finish(self, job: Job):
+        with self._condition:
+            job.finished_at = time.monotonic()
+            if job.window_name:
+                self._running_windows.discard(job.window_name)
+            if job.priority > INTERACTIVE:
+                self._running_background -= 1
+            self._trim_history()
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            _local.job = job
+            try:
+                job.target(*job.args)
+                job.status = "cancelled" if job.cancel_event.is_set() else "done"
+            # BaseException too: SystemExit or KeyboardInterrupt from a job
+            # must not kill the worker and leave the job marked running.
+            except BaseException as e:
+                job.status = "failed"
+                job.error = e
+                if self._on_error and not job.cancel_event.is_set():
+                    self._on_error(job)
+                if job.cancel_event.is_set():
+                    job.status = "cancelled"
+            finally:
+                _local.job = None
+                self._finish(job)
@@ -0,0 +1,71 @@
+import re
+
+CODE_PATTERN = re.compile(r"```.*?(```|$)|`[^`\n]*`|https?://\S+", re.DOTALL)
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+# Unicode ranges of the scripts used by languages not written in Latin script.
+SCRIPT_RANGES = {
+    "japanese": [(0x3040, 0x30FF), (0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xFF66, 0xFF9F)],
+    "chinese": [(0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF)],
+    "korean": [(0x1100, 0x11FF), (0x3130, 0x318F), (0xAC00, 0xD7AF)],
+    "russian": [(0x0400, 0x04FF)],
+    "ukrainian": [(0x0400, 0x04FF)],
+    "bulgarian": [(0x0400, 0x04FF)],
+    "serbian": [(0x0400, 0x04FF)],
+    "greek": [(0x0370, 0x03FF)],
+    "arabic": [(0x0600, 0x06FF), (0x0750, 0x077F)],
+    "persian": [(0x0600, 0x06FF)],
+    "urdu": [(0x0600, 0x06FF)],
+    "hebrew": [(0x0590, 0x05FF)],
+    "hindi": [(0x0900, 0x097F)],
+    "thai": [(0x0E00, 0x0E7F)],
+}
+
+# Common English words that are rare in other Latin-script languages.
+ENGLISH_WORDS = {
+    "the", "is", "are", "was", "were", "and", "of", "to", "how", "what", "why",
+    "when", "where", "which", "who", "do", "does", "did", "can", "could",
+    "should", "would", "with", "this", "that", "it", "for", "my", "you", "your",
+    "i", "me", "we", "there", "have", "has", "not", "from", "about", "please",
+    "an", "be", "if", "or", "on", "at", "by", "use", "using", "get", "make",
+}
+
+
+def strip_code(text: str) -> str:
+    return CODE_PATTERN.sub(" ", text)
+
+
+def script_ranges(language: str) -> list[tuple[int, int]]:
+    language = language.lower()
+    for name, ranges in SCRIPT_RANGES.items():
+        if name in language:
+            return ranges
+    return []
+
+
+def looks_english(text: str) -> bool:
+    words = [word.lower() for word in WORD_PATTERN.findall(text)]
+    if not words:
+        return True
+    letters = "".join(words)
+    if sum(not char.isascii() for char in letters) > len(letters) * 0.05:
+        return False
+    return sum(word in ENGLISH_WORDS for word in words) >= max(len(words) * 0.15, 1)
+
+
+def needs_translation(text: str, language: str) -> bool:
+    """Guesses whether `text` is written in `language` rather than English.
+
+    Languages with their own script are detected by character ranges. For
+    Latin-script languages the text is kept as is only when it reads as
+    English, so ambiguous input is still translated.
+    """
+    prose = strip_code(text)
+    if not WORD_PATTERN.search(prose):
+        return False
+    ranges = script_ranges(language)
+    if ranges:
+        return any(
+            start <= ord(char) <= end for char in prose for start, end in ranges
+        )
+    return not looks_english(prose)
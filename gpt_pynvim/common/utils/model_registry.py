@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+
+class ModelSpec(NamedTuple):
+    name: str
+    context_window: int
+    # Relative to the fastest model, lower is faster.
+    latency: float
+    # USD per 1K tokens.
+    cost: float
+
+
+class RouteDecision(NamedTuple):
+    task: str
+    model: str
+    tokens: int
+    reason: str
+    created_at: float
+
+
+class ModelRouter:
+    """Picks the model for each request from per-task routing rules.
+
+    Every task lists its candidate models. A request goes to the fastest
+    (then cheapest) candidate whose context window fits the prompt plus the
+    completion. With `overflow`, a request no candidate fits goes to the
+    fastest registered model that fits it instead. Recent decisions are kept
+    for `decisions`.
+    """
+
+    def __init__(self, models: dict[str, dict[str, Any]],
+                 routes: dict[str, list[str]], default_task: str,
+                 overflow: bool = True, log_size: int = 100):
+        self._models = {
+            name: ModelSpec(
+                name, int(spec["context_window"]),
+                float(spec.get("latency", 1.0)), float(spec.get("cost", 0.0)),
+            )
+            for name, spec in models.items()
+        }
+        self._routes = routes
+        self._default_task = default_task
+        self._overflow = overflow
+        self._decisions = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+
+    @property
+    def models(self) -> list[str]:
+        return list(self._models)
+
+    def spec(self, name: str) -> ModelSpec:
+        return self._models[name]
+
+    def unknown_models(self) -> list[str]:
+        return sorted({
+            name for names in self._routes.values() for name in names
+            if name not in self._models
+        })
+
+    def candidates(self, task: str) -> list[ModelSpec]:
+        names = self._routes.get(task) or self._routes[self._default_task]
+        return [self._models[name] for name in names if name in self._models]
+
+    def primary(self, task: str) -> ModelSpec:
+        """The model `task` uses when its prompt fits, e.g. for cache keys."""
+        return min(self.candidates(task), key=lambda spec: (spec.latency, spec.cost))
+
+    def route(self, task: str, tokens: int) -> RouteDecision:
+        """Routes a request of `tokens` prompt plus completion tokens."""
+        candidates = self.candidates(task)
+        fitting = [spec for spec in candidates if spec.context_window >= tokens]
+        reason = "fits"
+        if not fitting and self._overflow:
+            fitting = [
+                spec for spec in self._models.values() if spec.context_window >= tokens
+            ]
+            reason = "overflow"
+        if fitting:
+            model = min(fitting, key=lambda spec: (spec.latency, spec.cost))
+        else:
+            model = max(candidates, key=lambda spec: spec.context_window)
+            reason = "too long"
+        decision = RouteDecision(task, model.name, tokens, reason, time.time())
+        with self._lock:
+            self._decisions.append(decision)
+        return decision
+
+    def decisions(self) -> list[RouteDecision]:
+        with self._lock:
+            return list(self._decisions)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """Disk cache for fetched pages and their summaries.
+
+    Pages are stored per URL with their validators (ETag / Last-Modified) so
+    stale entries can be revalidated with a conditional request. Summaries are
+    stored per content hash, so an unchanged page skips every LLM call. File
+    mtimes double as the LRU clock used to evict entries past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl: float):
+        self._pages_dir = os.path.join(cache_dir, "pages")
+        self._summaries_dir = os.path.join(cache_dir, "summaries")
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(self._pages_dir, exist_ok=True)
+        os.makedirs(self._summaries_dir, exist_ok=True)
+
+    def get_page(self, url: str) -> dict[str, Any]:
+        page = self._read(self._page_path(url))
+        try:
+            return json.loads(page) if page else None
+        except ValueError:
+            return None
+
+    def is_fresh(self, page: dict[str, Any]) -> bool:
+        return time.time() - page.get("fetched_at", 0) < self._ttl
+
+    def revalidation_headers(self, page: dict[str, Any]) -> dict[str, str]:
+        headers = {}
+        if page and page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page and page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def put_page(self, url: str, title: str, text: str, etag: str = None,
+                 last_modified: str = None) -> dict[str, Any]:
+        page = {
+            "url": url,
+            "title": title,
+            "text": text,
+            "content_hash": content_hash(text),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        self._write(self._page_path(url), json.dumps(page))
+        return page
+
+    def touch_page(self, url: str, page: dict[str, Any]) -> dict[str, Any]:
+        page = {**page, "fetched_at": time.time()}
+        self._write(self._page_path(url), json.dumps(page))
+        return page
+
+    def summary_key(self, text: str, *options: str) -> str:
+        return content_hash("\0".join([content_hash(text), *options]))
+
+    def get_summary(self, key: str) -> str:
+        return self._read(os.path.join(self._summaries_dir, f"{key}.txt"))
+
+    def put_summary(self, key: str, summary: str):
+        self._write(os.path.join(self._summaries_dir, f"{key}.txt"), summary)
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in self._entries():
+                os.remove(path)
+
+    def _page_path(self, url: str) -> str:
+        return os.path.join(self._pages_dir, f"{content_hash(url)}.json")
+
+    def _read(self, path: str) -> str:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write(self, path: str, data: str):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+        for directory in (self._pages_dir, self._summaries_dir):
+            for entry in os.scandir(directory):
+                if entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[1])
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self._max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
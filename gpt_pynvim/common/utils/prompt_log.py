@@ -0,0 +1,142 @@
+import gzip
+import os
+import queue
+import shutil
+import threading
+
+ENTRY_HEADER = b"=="
+
+
+class PromptLog:
+    """Prompt log written by a background thread with size-based rotation.
+
+    A sidecar `.idx` file holds the byte offset of every entry in the current
+    log file so the viewer can seek straight to a page of entries instead of
+    reading the whole log.
+    """
+
+    def __init__(self, file_path: str, max_bytes: int = 0, backup_count: int = 0,
+                 compress: bool = False):
+        self._file_path = file_path
+        self._index_path = f"{file_path}.idx"
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._compress = compress
+        self._queue = queue.Queue()
+        self._thread = None
+        self._offsets = None
+        self._index_size = 0
+        self._lock = threading.RLock()
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    def write(self, entry: str):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._queue.put(entry)
+
+    def flush(self):
+        self._queue.join()
+
+    def entry_count(self) -> int:
+        self.flush()
+        with self._lock:
+            return len(self._load_offsets())
+
+    def read_entries(self, start: int, count: int) -> str:
+        self.flush()
+        with self._lock:
+            offsets = self._load_offsets()
+            start = max(start, 0)
+            end = min(start + count, len(offsets))
+            if start >= end:
+                return ""
+            with open(self._file_path, "rb") as f:
+                f.seek(offsets[start])
+                if end < len(offsets):
+                    data = f.read(offsets[end] - offsets[start])
+                else:
+                    data = f.read()
+        return data.decode("utf-8", errors="replace")
+
+    def clear(self):
+        self.flush()
+        with self._lock:
+            with open(self._file_path, "wb"):
+                pass
+            with open(self._index_path, "w"):
+                pass
+            self._offsets = []
+            self._index_size = 0
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self._append(entry.encode("utf-8"))
+            except OSError as e:
+                print("Error: Can't write prompt log:", e)
+            finally:
+                self._queue.task_done()
+
+    def _append(self, data: bytes):
+        with self._lock:
+            offsets = self._load_offsets()
+            size = os.path.getsize(self._file_path) if os.path.exists(self._file_path) else 0
+            if self._max_bytes and size and size + len(data) > self._max_bytes:
+                self._rotate()
+                offsets, size = self._offsets, 0
+            with open(self._file_path, "ab") as f:
+                f.write(data)
+            with open(self._index_path, "a") as f:
+                f.write(f"{size}\n")
+            offsets.append(size)
+            self._index_size = os.path.getsize(self._index_path)
+
+    def _rotate(self):
+        suffix = ".gz" if self._compress else ""
+        if self._backup_count:
+            for i in range(self._backup_count - 1, 0, -1):
+                src = f"{self._file_path}.{i}{suffix}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self._file_path}.{i + 1}{suffix}")
+            target = f"{self._file_path}.1{suffix}"
+            if self._compress:
+                with open(self._file_path, "rb") as src, gzip.open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfile(self._file_path, target)
+        with open(self._file_path, "wb"):
+            pass
+        with open(self._index_path, "w"):
+            pass
+        self._offsets = []
+        self._index_size = 0
+
+    def _load_offsets(self) -> list[int]:
+        if not os.path.exists(self._index_path):
+            self._offsets = self._build_index()
+            self._index_size = os.path.getsize(self._index_path)
+            return self._offsets
+        index_size = os.path.getsize(self._index_path)
+        if self._offsets is None or index_size != self._index_size:
+            with open(self._index_path, "r") as f:
+                self._offsets = [int(line) for line in f if line.strip()]
+            self._index_size = index_size
+        return self._offsets
+
+    def _build_index(self) -> list[int]:
+        offsets = []
+        if os.path.exists(self._file_path):
+            with open(self._file_path, "rb") as f:
+                offset = 0
+                for line in f:
+                    if line.startswith(ENTRY_HEADER):
+                        offsets.append(offset)
+                    offset += len(line)
+        with open(self._index_path, "w") as f:
+            f.writelines(f"{offset}\n" for offset in offsets)
+        return offsets
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float):
+        self._capacity = per_minute
+        self._rate = per_minute / 60.0
+        self._available = per_minute
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._available = min(
+            self._capacity, self._available + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # A request larger than the whole bucket may run once it is full.
+        amount = min(amount, self._capacity)
+        if self._available >= amount:
+            return 0.0
+        return (amount - self._available) / self._rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self._available -= min(amount, self._capacity)
+
+
+class RateLimiter:
+    """Client-side requests-per-minute and tokens-per-minute limits.
+
+    A limit of 0 disables that bucket. `acquire` blocks until both buckets
+    have room and returns False if `cancel_event` is set while waiting.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0, cancel_event: threading.Event = None) -> bool:
+        while True:
+            with self._lock:
+                wait = max(
+                    self._requests.wait_time(1) if self._requests else 0.0,
+                    self._tokens.wait_time(tokens) if self._tokens else 0.0,
+                )
+                if not wait:
+                    if self._requests:
+                        self._requests.consume(1)
+                    if self._tokens:
+                        self._tokens.consume(tokens)
+                    return True
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float,
+                  retry_after: float = None) -> float:
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+    # Full jitter: uniform between 0 and the exponential ceiling.
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import tiktoken
+
+from ..config import TOKEN_CACHE_SIZE
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str) -> "TokenCounter":
+    return TokenCounter(get_encoding(model_name))
+
+
+class TokenCounter:
+    """Token counts memoized per content hash in a bounded LRU.
+
+    Counts of stored history turns are persisted in the history records and
+    fed back through `seed`, so a fresh session does not re-encode history.
+    """
+
+    def __init__(self, encoding: tiktoken.Encoding,
+                 max_size: int = TOKEN_CACHE_SIZE):
+        self._encoding = encoding
+        self._max_size = max_size
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encoding_name(self) -> str:
+        return self._encoding.name
+
+    def key(self, content: str) -> str:
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        return f"{self._encoding.name}:{digest}"
+
+    def count(self, content: str) -> int:
+        key = self.key(content)
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                return self._counts[key]
+        num_tokens = len(self._encoding.encode(content))
+        self._remember(key, num_tokens)
+        return num_tokens
+
+    def seed(self, content: str, num_tokens: int):
+        self._remember(self.key(content), num_tokens)
+
+    def _remember(self, key: str, num_tokens: int):
+        with self._lock:
+            self._counts[key] = num_tokens
+            self._counts.move_to_end(key)
+            while len(self._counts) > self._max_size:
+                self._counts.popitem(last=False)
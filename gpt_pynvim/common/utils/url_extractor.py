@@ -0,0 +1,63 @@
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+MARKDOWN_LINK_PATTERN = re.compile(r"\[[^\]]*\]\(\s*<?([^()\s<>]+(?:\([^()\s]*\)[^()\s<>]*)*)>?")
+ANGLE_PATTERN = re.compile(r"<((?:https?://|www\.)[^<>\s]+)>", re.IGNORECASE)
+URL_PATTERN = re.compile(r"(?:https?://|www\.)[^\s<>\"'`]+", re.IGNORECASE)
+TRAILING_PUNCTUATION = ".,;:!?'\"*_~"
+BRACKETS = {")": "(", "]": "[", "}": "{"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def strip_trailing(url: str) -> str:
+    while url:
+        last = url[-1]
+        if last in TRAILING_PUNCTUATION:
+            url = url[:-1]
+        elif last in BRACKETS and url.count(BRACKETS[last]) < url.count(last):
+            url = url[:-1]
+        else:
+            break
+    return url
+
+
+def normalize_url(url: str) -> str:
+    if url.lower().startswith("www."):
+        url = f"https://{url}"
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname or parts.username:
+        return None
+    netloc = parts.hostname
+    if ":" in netloc:
+        netloc = f"[{netloc}]"
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def extract_urls(text: str) -> list[str]:
+    """Returns the http(s) URLs in `text`, normalized and in first-seen order.
+
+    Markdown links and `<...>` autolinks are read first and removed, so the
+    plain-URL pass does not pick up their titles or brackets.
+    """
+    candidates = []
+    for pattern in (MARKDOWN_LINK_PATTERN, ANGLE_PATTERN):
+        for match in pattern.finditer(text):
+            candidates.append((match.start(), match.group(1)))
+        text = pattern.sub(lambda m: " " * len(m.group(0)), text)
+    for match in URL_PATTERN.finditer(text):
+        candidates.append((match.start(), strip_trailing(match.group(0))))
+    urls = []
+    seen = set()
+    for _, candidate in sorted(candidates, key=lambda item: item[0]):
+        url = normalize_url(candidate)
+        if url and url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
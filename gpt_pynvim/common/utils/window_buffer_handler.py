@@ -1,42 +1,117 @@
-import os
+import threading
+import time
+import unicodedata
 import vim
 
 from ..config import (
     OPEN_WINDOW_DIRECTION,
     OPEN_WINDOW_SIZE,
+    STREAM_UPDATE_INTERVAL,
+    RENDER_INTERVAL,
 )
 
+# getpos() reports this column for a block selection extended with `$`.
+MAX_COLUMN = 2147483647
+
 
 def get_selected_lines() -> str:
-    contents = []
-    start_row, start_col = vim.eval('getpos("\'<")[1:2]')
-    end_row, end_col = vim.eval('getpos("\'>")[1:2]')
-    for row in range(int(start_row), int(end_row) + 1):
-        line = vim.eval(f"getline({row})")
-        # contents.append(line[int(start_col) - 1: int(end_col) - 1])
-        contents.append(line)
-    return "\n".join(contents)
+    start_row, end_row, start_vcol, end_vcol, end_col, mode, tabstop = vim.eval(
+        '[line("\'<"), line("\'>"), virtcol("\'<"), virtcol("\'>"), '
+        + 'getpos("\'>")[2], visualmode(), &tabstop]'
+    )
+    lines = vim.api.buf_get_lines(0, int(start_row) - 1, int(end_row), False)
+    if mode == "\x16":
+        left, right = sorted((int(start_vcol), int(end_vcol)))
+        if int(end_col) >= MAX_COLUMN:
+            # The block was extended to the end of each line with `$`.
+            right = None
+        lines = [
+            slice_display_columns(line, left, right, int(tabstop)) for line in lines
+        ]
+    return "\n".join(lines)
+
+
+def slice_display_columns(line: str, left: int, right: int = None,
+                          tabstop: int = 8) -> str:
+    """Returns the part of `line` shown in display columns `left`..`right`."""
+    result = []
+    column = 1
+    for char in line:
+        if char == "\t":
+            width = tabstop - (column - 1) % tabstop
+        elif unicodedata.east_asian_width(char) in ("W", "F"):
+            width = 2
+        else:
+            width = 1
+        if right is not None and column > right:
+            break
+        if column + width - 1 >= left:
+            result.append(char)
+        column += width
+    return "".join(result)
+
+
+class WindowRegistry:
+    """Maps the plugin's window names to their buffer handles.
+
+    Buffers are registered when the plugin opens them and by the
+    BufWinEnter/BufWipeout autocmds in autoload/gpt_pynvim.vim, so a lookup
+    is one `win_findbuf` call instead of a scan over every window.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def register(self, window_name: str, buffer: int):
+        with self._lock:
+            self._buffers[window_name] = buffer
+
+    def forget(self, buffer: int):
+        with self._lock:
+            for window_name, handle in list(self._buffers.items()):
+                if handle == buffer:
+                    del self._buffers[window_name]
+
+    def buffer(self, window_name: str) -> int:
+        with self._lock:
+            return self._buffers.get(window_name)
+
+    def window(self, window_name: str) -> int:
+        buffer = self.buffer(window_name)
+        if buffer is None:
+            return None
+        windows = vim.call("win_findbuf", buffer)
+        return windows[0] if windows else None
+
+
+window_registry = WindowRegistry()
 
 
 def check_window_name(window_name: str) -> bool:
-    for window in vim.windows:
-        if os.path.basename(window.buffer.name) == window_name:
-            return True
+    if window_registry.window(window_name) is not None:
+        return True
     vim.command(f"echo 'Error: {window_name} is not open.'")
     return False
 
 
 def close_window(window_name: str):
-    for window in vim.windows:
-        if os.path.basename(window.buffer.name) == window_name:
-            vim.api.win_close(window.handle, True)
-            break
+    window = window_registry.window(window_name)
+    if window is not None:
+        vim.api.win_close(window, True)
+
+
+def open_split(window_name: str, direction: str = OPEN_WINDOW_DIRECTION) -> int:
+    vim.command(f"{direction} {window_name}")
+    set_common_vim_buffer_options()
+    buffer = vim.current.buffer.handle
+    window_registry.register(window_name, buffer)
+    return buffer
 
 
 def open_window(window_name: str):
     close_window(window_name)
-    vim.command(f"{OPEN_WINDOW_DIRECTION} {window_name}")
-    set_common_vim_buffer_options()
+    open_split(window_name)
     vim.command("startinsert")
 
 
@@ -62,16 +137,15 @@ def unsafe_update_window_buffer(window_name: str, buffer_content: str, mode: str
     if not buffer_content:
         return
 
-    for window in vim.windows:
-        if os.path.basename(window.buffer.name) == window_name:
-            vim.current.window = window
-            break
+    window = window_registry.window(window_name)
+    if window is not None:
+        vim.api.set_current_win(window)
     else:
-        vim.command(f"{OPEN_WINDOW_DIRECTION} {window_name}")
-        set_common_vim_buffer_options()
+        open_split(window_name)
 
     messages = buffer_content.split("\n")
     if mode == "w":
+        render_queue.discard(window_name)
         vim.current.buffer[:] = [line for line in messages if line]
         vim.command("normal gg")
     elif mode == "a":
@@ -79,5 +153,152 @@ def unsafe_update_window_buffer(window_name: str, buffer_content: str, mode: str
         vim.command("normal G")
 
 
+class RenderQueue:
+    """Coalesces buffer updates and applies them from the main loop.
+
+    Updates queued from worker threads are merged per window and written
+    with a single `nvim_buf_set_lines` call covering only the changed line
+    range, without switching the current window. Flushes are capped at one
+    per `interval` seconds.
+    """
+
+    def __init__(self, interval: float = RENDER_INTERVAL):
+        self._interval = interval
+        self._pending = {}
+        self._scheduled = False
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def enqueue(self, window_name: str, buffer_content: str, mode: str = "a"):
+        if not buffer_content:
+            return
+        lines = [line for line in buffer_content.split("\n") if line]
+        with self._lock:
+            ops = self._pending.setdefault(window_name, [])
+            if mode == "w":
+                ops.clear()
+            ops.append((mode, lines, None))
+        self._schedule()
+
+    def enqueue_stream(self, window_name: str, stream: "WindowBufferStream",
+                       content: str):
+        lines = [line for line in content.split("\n") if line]
+        with self._lock:
+            ops = self._pending.setdefault(window_name, [])
+            # Each stream update carries the full text, so only the last counts.
+            if ops and ops[-1][2] is stream:
+                ops.pop()
+            ops.append(("s", lines, stream))
+        self._schedule()
+
+    def discard(self, window_name: str):
+        with self._lock:
+            self._pending.pop(window_name, None)
+
+    def _schedule(self):
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+            delay = self._interval - (time.monotonic() - self._last_flush)
+        if delay > 0:
+            timer = threading.Timer(delay, vim.async_call, (self.flush,))
+            timer.daemon = True
+            timer.start()
+        else:
+            vim.async_call(self.flush)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            self._last_flush = time.monotonic()
+        for window_name, ops in pending.items():
+            if ops:
+                self._render(window_name, ops)
+
+    def _render(self, window_name: str, ops: list[tuple]):
+        buffer = window_registry.buffer(window_name)
+        windows = vim.call("win_findbuf", buffer) if buffer is not None else []
+        if not windows:
+            buffer = open_split(window_name)
+            windows = vim.call("win_findbuf", buffer)
+        old_lines = vim.api.buf_get_lines(buffer, 0, -1, False)
+        new_lines = list(old_lines)
+        cursor_line = None
+        for mode, lines, stream in ops:
+            if mode == "w":
+                new_lines = lines
+                cursor_line = 1
+            elif mode == "a":
+                new_lines = new_lines + lines
+                cursor_line = len(new_lines)
+            elif mode == "s":
+                if stream.start_line is None:
+                    stream.start_line = len(new_lines)
+                new_lines = new_lines[:stream.start_line] + lines
+                cursor_line = len(new_lines)
+        if not new_lines:
+            new_lines = [""]
+        start = 0
+        limit = min(len(old_lines), len(new_lines))
+        while start < limit and old_lines[start] == new_lines[start]:
+            start += 1
+        end = 0
+        while (end < limit - start
+               and old_lines[-1 - end] == new_lines[-1 - end]):
+            end += 1
+        if start < len(old_lines) - end or start < len(new_lines) - end:
+            vim.api.buf_set_lines(
+                buffer, start, len(old_lines) - end, False,
+                new_lines[start:len(new_lines) - end],
+            )
+        if cursor_line:
+            for window in windows:
+                vim.api.win_set_cursor(window, [max(cursor_line, 1), 0])
+
+
+render_queue = RenderQueue()
+
+
 def update_window_buffer(window_name: str, buffer_content: str, mode: str = "a"):
-    vim.async_call(unsafe_update_window_buffer, window_name, buffer_content, mode)
+    render_queue.enqueue(window_name, buffer_content, mode)
+
+
+class WindowBufferStream:
+    """Collects streamed deltas and renders them into a window.
+
+    Deltas are batched and handed to the render queue at most once per
+    `interval` seconds. Each flush rewrites only the lines this stream owns.
+    """
+
+    def __init__(self, window_name: str, mode: str = "a",
+                 interval: float = STREAM_UPDATE_INTERVAL):
+        self._window_name = window_name
+        self._interval = interval
+        self._chunks = []
+        self._dirty = False
+        self._last_flush = 0.0
+        self.start_line = 0 if mode == "w" else None
+        self._lock = threading.Lock()
+
+    @property
+    def content(self) -> str:
+        return "".join(self._chunks)
+
+    def write(self, delta: str):
+        with self._lock:
+            self._chunks.append(delta)
+            self._dirty = True
+            if time.monotonic() - self._last_flush >= self._interval:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._dirty:
+                self._flush()
+
+    def _flush(self):
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        render_queue.enqueue_stream(self._window_name, self, self.content)